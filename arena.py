@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""
+自己対戦アリーナ
+2つの main.py 形式のAIを先後入れ替えで対戦させ、勝率とCPU時間を比較する
+
+使い方: python arena.py main.py old_main.py --games 50 --opening-plies 4 --results run.jsonl
+       python arena.py main.py main.py --mode-a mcts --mode-b alphabeta  # 探索方式の比較
+同じシードの序盤（ランダムな数手）から先後を入れ替えて2局ずつ指す。
+対局はプロセスプールで全コアに分散し、終わった順に結果を表示して JSONL に追記する。
+同じ --results を指定して再実行すると、記録済みの対局を飛ばして続きから再開する（AIと対局条件が
+同じ記録だけを使い、今回のシードの範囲の対局だけを集計する）。
+結果ファイルには棋譜も残るので、corpus.py --mode selfplay で局面集の材料にできる。
+サーバと同じく1手のCPU時間が上限を超えた手・例外・無効な座標は、
+左上から置けるマスへの強制配置に置き換える。
+結果として勝ち/引き分け/負け、勝利までの手数、1手あたりのCPU時間、探索統計（get_search_stats を持つAIのみ）、
+Eloレーティング差の推定値と SPRT（逐次確率比検定）の判定を表示する。
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import multiprocessing
+import os
+import random
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import local_driver
+import local_framework  # noqa: F401  main より先に読み込む
+
+CPU_LIMIT = 3.0  # サーバの1手あたりCPU時間の上限（秒）
+
+
+def load_engine(path: str):
+    """local_driver.load_ai で main.py 形式のファイルを読み込み、MyAI クラスを返す
+
+    対局ごとに新しいインスタンスを作るため（置換表などを持ち越さないように）クラスを返す。
+    """
+    return type(local_driver.load_ai(path))
+
+
+def fallback_move(board: local_driver.Board) -> Tuple[int, int]:
+    """サーバの強制配置と同じく、左上から順に見て最初に置けるマスを返す"""
+    for y in range(4):
+        for x in range(4):
+            if board[3][y][x] == 0:
+                return x, y
+    raise ValueError("盤面が満杯です")
+
+
+def is_win(board: local_driver.Board, x: int, y: int, z: int, player: int) -> bool:
+    """(x, y, z) に置いた player の石で4つ揃ったかを判定する"""
+    for dx, dy, dz in [
+        (1, 0, 0), (0, 1, 0), (0, 0, 1), (1, 1, 0), (1, -1, 0), (1, 0, 1), (1, 0, -1),
+        (0, 1, 1), (0, 1, -1), (1, 1, 1), (1, 1, -1), (1, -1, 1), (1, -1, -1),
+    ]:
+        count = 1
+        for sign in (1, -1):
+            nx, ny, nz = x + dx * sign, y + dy * sign, z + dz * sign
+            while 0 <= nx < 4 and 0 <= ny < 4 and 0 <= nz < 4 and board[nz][ny][nx] == player:
+                count += 1
+                nx, ny, nz = nx + dx * sign, ny + dy * sign, nz + dz * sign
+        if count >= 4:
+            return True
+    return False
+
+
+SEARCH_COUNTERS = ("nodes", "threat_nodes", "elapsed", "leaf_evaluations", "cutoffs",
+                   "first_move_cutoffs", "pvs_researches", "aspiration_researches", "playouts", "reused_visits",
+                   "tt_probes", "tt_hits", "tt_collisions", "tt_overwrites")  # 足し合わせる探索統計
+
+
+def merge_search_stats(total: dict, stats: dict) -> None:
+    """MyAI.get_search_stats() の1手分の探索統計を total に足し合わせる
+
+    カウンタは合計し、手を選んだ理由ごとの回数、反復深化で探索した手の
+    完了した深さと実効分岐数の合計も数える（平均は summarize で出す）。
+    """
+    for counter in SEARCH_COUNTERS:
+        total[counter] = total.get(counter, 0) + stats.get(counter, 0)
+    reasons = total.setdefault("reasons", {})
+    reasons[stats["reason"]] = reasons.get(stats["reason"], 0) + 1
+    if stats["iterations"]:
+        total["searched"] = total.get("searched", 0) + 1
+        total["depth"] = total.get("depth", 0) + stats["completed_depth"]
+    if stats["effective_branching_factor"] > 0:
+        total["ebf_moves"] = total.get("ebf_moves", 0) + 1
+        total["ebf"] = total.get("ebf", 0.0) + stats["effective_branching_factor"]
+
+
+def play_game(engines: Dict[str, type], seed: int, a_first: bool, opening_plies: int,
+              cpu_limit: float = CPU_LIMIT, move_time: Optional[float] = None,
+              search_modes: Optional[Dict[str, str]] = None) -> dict:
+    """1局指して結果を返す
+
+    engines は {"A": クラス, "B": クラス}。序盤の opening_plies 手は seed から決まるランダムな手。
+    move_time を指定すると、time_limit 属性を持つAIの持ち時間をその値にする。
+    search_modes（{"A": "mcts", ...}）を指定すると、search_mode 属性を持つAIの探索方式をその値にする。
+    """
+    rng = random.Random(seed)
+    names = {1: "A" if a_first else "B", 2: "B" if a_first else "A"}
+    ais = {}
+    for player, name in names.items():
+        ai = engines[name]()
+        if move_time is not None and hasattr(ai, "time_limit"):
+            ai.time_limit = move_time
+        if search_modes and search_modes.get(name) and hasattr(ai, "search_mode"):
+            ai.search_mode = search_modes[name]
+        ais[player] = ai
+
+    board = local_driver.create_board()
+    stats = {name: {"moves": 0, "cpu": 0.0, "max_cpu": 0.0, "forced": 0, "search": {}} for name in ("A", "B")}
+    player = 1
+    last_move = (None, None, None)
+    winner = None
+    plies = 0
+    moves = []
+    for plies in range(1, 65):
+        if plies <= opening_plies:
+            x, y = rng.choice([(x, y) for y in range(4) for x in range(4) if board[3][y][x] == 0])
+        else:
+            name = names[player]
+            started = time.process_time()
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    x, y = ais[player].get_move(board, player, last_move)
+                valid = 0 <= x < 4 and 0 <= y < 4 and board[3][y][x] == 0
+                if hasattr(ais[player], "get_search_stats"):
+                    merge_search_stats(stats[name]["search"], ais[player].get_search_stats())
+            except Exception:
+                valid = False
+            elapsed = time.process_time() - started
+            if not valid or elapsed > cpu_limit:
+                x, y = fallback_move(board)
+                stats[name]["forced"] += 1
+            stats[name]["moves"] += 1
+            stats[name]["cpu"] += elapsed
+            stats[name]["max_cpu"] = max(stats[name]["max_cpu"], elapsed)
+
+        z = next(z for z in range(4) if board[z][y][x] == 0)
+        local_driver.place_disk(board, x, y, player)
+        moves.append([x, y])
+        if is_win(board, x, y, z, player):
+            winner = names[player]
+            break
+        last_move = (x, y, z)
+        player = 3 - player
+
+    return {"seed": seed, "a_first": a_first, "winner": winner, "plies": plies, "stats": stats, "moves": moves}
+
+
+def game_seed(seed: int, a_first: bool) -> int:
+    """対局ごとの乱数シード（AI内部で random を使う場合も再現できるように固定する）"""
+    return seed * 2 + (0 if a_first else 1)
+
+
+def play_task(engines: Dict[str, type], task: tuple) -> dict:
+    """(シード, A が先手か, 序盤の手数, CPU上限, 持ち時間, 探索方式) の対局を1つ指す"""
+    seed, a_first, opening_plies, cpu_limit, move_time, search_modes = task
+    random.seed(game_seed(seed, a_first))
+    return play_game(engines, seed, a_first, opening_plies, cpu_limit, move_time, search_modes)
+
+
+_worker_engines: Dict[str, type] = {}  # プロセスプールの各ワーカーで読み込んだAI
+
+
+def _init_worker(path_a: str, path_b: str) -> None:
+    """ワーカープロセスの初期化: AIファイルを一度だけ読み込む"""
+    _worker_engines["A"] = load_engine(path_a)
+    _worker_engines["B"] = load_engine(path_b)
+
+
+def _run_worker_task(task: tuple) -> dict:
+    return play_task(_worker_engines, task)
+
+
+def run_games(path_a: str, path_b: str, tasks: List[tuple], workers: int) -> Iterator[dict]:
+    """対局をプロセスプールで並列に指し、終わった順に結果を返す（workers=1 なら同じプロセスで順に指す）"""
+    if workers <= 1:
+        engines = {"A": load_engine(path_a), "B": load_engine(path_b)}
+        for task in tasks:
+            yield play_task(engines, task)
+        return
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(path_a, path_b)) as pool:
+        for result in pool.imap_unordered(_run_worker_task, tasks):
+            yield result
+
+
+def load_results(path: str, engine_a: str, engine_b: str, settings: dict) -> List[dict]:
+    """中断した実行の結果ファイル（JSONL）から、同じAIの組み合わせ・同じ対局条件の結果を読み込む
+
+    settings は序盤の手数・CPU上限・持ち時間の辞書。どちらかが違う記録があれば混ぜずにエラーにする。
+    """
+    if not os.path.exists(path):
+        return []
+    results = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            result = json.loads(line)
+            if result.get("engine_a") != engine_a or result.get("engine_b") != engine_b:
+                raise ValueError(f"{path} には別のAIの組み合わせの結果が記録されています")
+            if result.get("settings") != settings:
+                raise ValueError(f"{path} には別の対局条件の結果が記録されています: "
+                                 f"{result.get('settings')}（今回は {settings}）")
+            results.append(result)
+    return results
+
+
+def elo_from_score(score: float) -> float:
+    """期待得点（0〜1）をEloレーティング差に変換する"""
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+
+def score_from_elo(elo: float) -> float:
+    """Eloレーティング差を期待得点に変換する"""
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def elo_interval(wins: int, draws: int, losses: int) -> Tuple[float, float, float]:
+    """A から見た Elo差の推定値と95%信頼区間 (推定値, 下限, 上限) を返す"""
+    games = wins + draws + losses
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    margin = 1.96 * math.sqrt(variance / games)
+    return elo_from_score(score), elo_from_score(score - margin), elo_from_score(score + margin)
+
+
+def likelihood_of_superiority(wins: int, losses: int) -> float:
+    """A が B より強い確率（引き分けを除いた正規近似）"""
+    if wins + losses == 0:
+        return 0.5
+    return 0.5 * (1 + math.erf((wins - losses) / math.sqrt(2 * (wins + losses))))
+
+
+def sprt(wins: int, draws: int, losses: int, elo0: float, elo1: float,
+         alpha: float = 0.05, beta: float = 0.05) -> Tuple[float, float, float, str]:
+    """H0: Elo差=elo0 と H1: Elo差=elo1 の逐次確率比検定
+
+    (対数尤度比, 下側の境界, 上側の境界, 判定) を返す。対数尤度比は
+    1局の得点を正規分布で近似したもの（fishtest などと同じ近似）。
+    """
+    lower = math.log(beta / (1 - alpha))
+    upper = math.log((1 - beta) / alpha)
+    games = wins + draws + losses
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    if variance == 0:
+        return 0.0, lower, upper, "判定不能（結果に差がない）"
+    s0, s1 = score_from_elo(elo0), score_from_elo(elo1)
+    llr = games * (s1 - s0) * (2 * score - s0 - s1) / (2 * variance)
+    if llr >= upper:
+        verdict = "H1 を採択（改善あり）"
+    elif llr <= lower:
+        verdict = "H0 を採択（改善なし）"
+    else:
+        verdict = "継続（まだ決まらない）"
+    return llr, lower, upper, verdict
+
+
+def merge_totals(total: dict, other: dict) -> None:
+    """merge_search_stats で集計した辞書どうしを足し合わせる"""
+    for key, value in other.items():
+        if isinstance(value, dict):
+            merge_totals(total.setdefault(key, {}), value)
+        else:
+            total[key] = total.get(key, 0) + value
+
+
+def format_search_stats(search: dict) -> str:
+    """集計した探索統計を1行の文字列にする"""
+    reasons = ", ".join(f"{reason} {count}" for reason, count in sorted(
+        search["reasons"].items(), key=lambda item: -item[1]))
+    parts = [f"手の理由: {reasons}"]
+    if search.get("searched"):
+        parts.append(f"平均深さ {search['depth'] / search['searched']:.1f}")
+    if search["elapsed"] > 0:
+        parts.append(f"{search['nodes'] / search['elapsed']:.0f}ノード/秒")
+    if search["threat_nodes"]:
+        parts.append(f"連続リーチ {search['threat_nodes'] / sum(search['reasons'].values()):.0f}ノード/手")
+    if search["cutoffs"]:
+        parts.append(f"初手カット率 {search['first_move_cutoffs'] / search['cutoffs'] * 100:.1f}%")
+    if search["tt_probes"]:
+        parts.append(f"置換表ヒット率 {search['tt_hits'] / search['tt_probes'] * 100:.1f}% "
+                     f"(衝突 {search['tt_collisions'] / search['tt_probes'] * 100:.1f}%, "
+                     f"上書き {search['tt_overwrites']}回)")
+    if search["pvs_researches"] or search["aspiration_researches"]:
+        parts.append(f"読み直し PVS {search['pvs_researches']}回 / アスピレーション {search['aspiration_researches']}回")
+    if search["playouts"]:
+        parts.append(f"プレイアウト {search['playouts'] / search['reasons'].get('mcts', 1):.0f}回/手 "
+                     f"(引き継ぎ {search['reused_visits'] / search['reasons'].get('mcts', 1):.0f}回/手)")
+    if search.get("ebf_moves"):
+        parts.append(f"実効分岐数 {search['ebf'] / search['ebf_moves']:.2f}")
+    return "探索: " + ", ".join(parts)
+
+
+def summarize(results: List[dict], elo0: float = 0.0, elo1: float = 10.0) -> str:
+    """対局結果の一覧を A から見た集計レポートにする"""
+    wins = sum(1 for r in results if r["winner"] == "A")
+    losses = sum(1 for r in results if r["winner"] == "B")
+    draws = len(results) - wins - losses
+    lines = [f"対局数 {len(results)}: A の {wins}勝 {draws}分 {losses}敗"]
+
+    for name in ("A", "B"):
+        won = [r["plies"] for r in results if r["winner"] == name]
+        moves = sum(r["stats"][name]["moves"] for r in results)
+        cpu = sum(r["stats"][name]["cpu"] for r in results)
+        max_cpu = max((r["stats"][name]["max_cpu"] for r in results), default=0.0)
+        forced = sum(r["stats"][name]["forced"] for r in results)
+        average_plies = f"{sum(won) / len(won):.1f}手" if won else "-"
+        per_move = cpu / moves if moves else 0.0
+        lines.append(f"  {name}: 勝利までの平均手数 {average_plies}, 1手あたりCPU {per_move:.3f}秒 "
+                     f"(最大 {max_cpu:.3f}秒), 強制配置 {forced}回")
+
+        search = {}
+        for r in results:
+            merge_totals(search, r["stats"][name].get("search", {}))
+        if search:
+            lines.append("    " + format_search_stats(search))
+
+    # 同じシードの2局（先後入れ替え）ごとの A の得点
+    pairs: Dict[int, float] = {}
+    for r in results:
+        pairs[r["seed"]] = pairs.get(r["seed"], 0.0) + (1.0 if r["winner"] == "A" else 0.5 if r["winner"] is None else 0.0)
+    counts = {}
+    for points in pairs.values():
+        counts[points] = counts.get(points, 0) + 1
+    lines.append("  先後ペアごとの A の得点: " + ", ".join(
+        f"{points:g}点 {counts[points]}組" for points in sorted(counts, reverse=True)))
+
+    if results:
+        elo, low, high = elo_interval(wins, draws, losses)
+        lines.append(f"  Elo差 {elo:+.1f} (95%信頼区間 {low:+.1f} 〜 {high:+.1f}), "
+                     f"A が強い確率 {likelihood_of_superiority(wins, losses) * 100:.1f}%")
+        llr, lower, upper, verdict = sprt(wins, draws, losses, elo0, elo1)
+        lines.append(f"  SPRT [{elo0:g}, {elo1:g}]: LLR {llr:.2f} (境界 {lower:.2f}, {upper:.2f}) → {verdict}")
+    return "\n".join(lines)
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description="2つのAIを先後入れ替えで対戦させて強さを比較する")
+    parser.add_argument("engine_a", help="AIファイル A（main.py 形式）")
+    parser.add_argument("engine_b", help="AIファイル B（main.py 形式）")
+    parser.add_argument("--games", type=int, default=20, help="先後入れ替えの組数（対局数はこの2倍）")
+    parser.add_argument("--opening-plies", type=int, default=4, help="序盤にランダムに打つ手数")
+    parser.add_argument("--seed", type=int, default=0, help="最初の組のシード")
+    parser.add_argument("--cpu-limit", type=float, default=CPU_LIMIT, help="1手のCPU時間の上限（秒）")
+    parser.add_argument("--move-time", type=float, default=None, help="AIの持ち時間 time_limit を上書きする（秒）")
+    parser.add_argument("--mode-a", choices=("alphabeta", "mcts"), default=None, help="A の探索方式 search_mode を上書きする")
+    parser.add_argument("--mode-b", choices=("alphabeta", "mcts"), default=None, help="B の探索方式 search_mode を上書きする")
+    parser.add_argument("--elo0", type=float, default=0.0, help="SPRT の帰無仮説の Elo差")
+    parser.add_argument("--elo1", type=float, default=10.0, help="SPRT の対立仮説の Elo差")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="並列に対局するプロセス数")
+    parser.add_argument("--results", default=None, help="対局結果を追記する JSONL ファイル（再実行で続きから再開）")
+    args = parser.parse_args()
+
+    # 同じファイルでも探索方式が違えば別のAIとして結果を記録する
+    label_a = f"{args.engine_a}:{args.mode_a}" if args.mode_a else args.engine_a
+    label_b = f"{args.engine_b}:{args.mode_b}" if args.mode_b else args.engine_b
+    search_modes = {"A": args.mode_a, "B": args.mode_b}
+    settings = {"opening_plies": args.opening_plies, "cpu_limit": args.cpu_limit, "move_time": args.move_time}
+    seeds = range(args.seed, args.seed + args.games)
+    results = load_results(args.results, label_a, label_b, settings) if args.results else []
+    # 今回のシードの範囲外の記録はファイルに残したまま集計に含めない
+    results = [r for r in results if r["seed"] in seeds]
+    done = {(r["seed"], r["a_first"]) for r in results}
+    if done:
+        print(f"{args.results} から {len(done)} 局を読み込みました（続きから再開）")
+    tasks = [
+        (seed, a_first, args.opening_plies, args.cpu_limit, args.move_time, search_modes)
+        for seed in seeds
+        for a_first in (True, False)
+        if (seed, a_first) not in done
+    ]
+
+    output = open(args.results, "a", encoding="utf-8") if args.results else None
+    try:
+        for result in run_games(args.engine_a, args.engine_b, tasks, args.workers):
+            result["engine_a"], result["engine_b"] = label_a, label_b
+            result["settings"] = settings
+            results.append(result)
+            if output:
+                output.write(json.dumps(result, ensure_ascii=False) + "\n")
+                output.flush()
+            first = "A" if result["a_first"] else "B"
+            print(f"[{len(results)}/{args.games * 2}] シード{result['seed']} 先手{first}: "
+                  f"勝者 {result['winner'] or '引き分け'} ({result['plies']}手)", flush=True)
+    except KeyboardInterrupt:
+        print("\n中断しました（--results を指定していれば同じコマンドで再開できます）")
+    finally:
+        if output:
+            output.close()
+    print()
+    if results:
+        print(summarize(results, args.elo0, args.elo1))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+MyAI のマイクロベンチマーク
+主要な関数を corpus.py で作った局面集（既定は corpus.txt）で繰り返し実行し、1回あたりの時間を測る
+
+使い方:
+  python bench.py                                  # corpus.txt で計測して表示
+  python bench.py --save-baseline bench_baseline.json
+  python bench.py --baseline bench_baseline.json --threshold 0.2
+  python bench.py --builtin                        # 組み込みの小さな局面集（空・中盤・終盤近く・戦術的）で計測
+基準値より threshold（割合）を超えて遅くなったベンチマークがあれば終了コード1で終わる。
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+import local_framework  # noqa: F401  main より先に読み込む
+
+from corpus import load_corpus, play_random_position
+from main import BitBoard, MyAI
+
+CORPUS_SEED = 20240926  # 局面集を作る乱数のシード（変えると基準値と比較できなくなる）
+SEARCH_DEPTH = 3  # 探索ベンチマークの深さ
+
+
+def build_corpus() -> List[Tuple[str, BitBoard, int]]:
+    """ベンチマーク用の局面集 (種類, 盤面, 手番) を作る"""
+    rng = random.Random(CORPUS_SEED)
+    ai = MyAI()
+    corpus = [("empty", BitBoard(), 1)]
+    for stones in (12, 18, 24):
+        pos, player = play_random_position(rng, ai, stones)
+        corpus.append(("midgame", pos, player))
+    for stones in (44, 50):
+        pos, player = play_random_position(rng, ai, stones)
+        corpus.append(("near-full", pos, player))
+    # 戦術的: 相手の勝ちマス（受けなければならないリーチ）がある局面
+    while sum(1 for kind, _, _ in corpus if kind == "tactical") < 3:
+        pos, player = play_random_position(rng, ai, rng.randrange(14, 30))
+        if ai.find_winning_move(pos, 3 - player):
+            corpus.append(("tactical", pos, player))
+    return corpus
+
+
+def replay_corpus(path: str) -> List[Tuple[str, BitBoard, int]]:
+    """corpus.py で作った局面集をベンチマーク用の局面集 (種類, 盤面, 手番) にする
+
+    受けのタグが付いた局面は tactical、それ以外は段階名を種類にする。
+    """
+    corpus = []
+    for pos, player, phase, tags in load_corpus(path):
+        kind = "tactical" if "block" in tags else phase
+        corpus.append((kind, pos, player))
+    return corpus
+
+
+def measure(function: Callable[[], int], min_time: float = 0.2) -> float:
+    """function を min_time 秒以上繰り返して1回あたりの時間（ナノ秒）を返す
+
+    function は1回の呼び出しで実行した操作数を返す。他のプロセスの影響を受けにくいよう
+    CPU時間で測り、5回計測して最短を使う。
+    """
+    best = float("inf")
+    for _ in range(5):
+        operations = 0
+        started = time.process_time_ns()
+        while True:
+            operations += function()
+            elapsed = time.process_time_ns() - started
+            if elapsed >= min_time * 1e9:
+                break
+        best = min(best, elapsed / operations)
+    return best
+
+
+def run_benchmarks(corpus: List[Tuple[str, BitBoard, int]], move_time: float) -> Dict[str, dict]:
+    """各ベンチマークを実行して {名前: {"ns_per_op": ..., "nodes_per_sec": ...}} を返す"""
+    ai = MyAI()
+    results = {}
+
+    def over_cells(operation: Callable[[BitBoard, int, int, int, int, int], None]) -> Callable[[], int]:
+        """局面集の全局面・全合法手で operation を呼ぶ関数を作る"""
+        cases = [(pos, player, x, y, z) for _, pos, player in corpus for x, y, z in ai.get_legal_moves(pos)]
+
+        def run() -> int:
+            for pos, player, x, y, z in cases:
+                operation(pos, player, x, y, z)
+            return len(cases)
+        return run
+
+    def over_positions(operation: Callable[[BitBoard, int], None]) -> Callable[[], int]:
+        """局面集の全局面で operation を呼ぶ関数を作る"""
+        def run() -> int:
+            for _, pos, player in corpus:
+                operation(pos, player)
+            return len(corpus)
+        return run
+
+    benchmarks = {
+        "check_win": over_cells(lambda pos, p, x, y, z: ai.check_win(pos, x, y, z, p)),
+        "classify_directions": over_cells(lambda pos, p, x, y, z: ai.classify_directions(pos, x, y, z, p)),
+        "evaluate_static": over_cells(lambda pos, p, x, y, z: ai.evaluate_static(pos, x, y, z, p, 0)),
+        "find_winning_move": over_positions(lambda pos, p: ai.find_winning_move(pos, p)),
+        "score_moves": over_positions(lambda pos, p: ai.score_moves(pos, p)),
+        "place_remove": over_cells(lambda pos, p, x, y, z: (pos.place(x, y, p), pos.remove(x, y))),
+    }
+    for name, function in benchmarks.items():
+        results[name] = {"ns_per_op": measure(function)}
+
+    # 固定深さの探索: ノード数/秒
+    nodes = 0
+    started = time.process_time()
+    for _, pos, player in corpus:
+        search_ai = MyAI()
+        search_ai._deadline = float("inf")
+        search_ai.search_best_move(pos.copy(), player, SEARCH_DEPTH)
+        nodes += search_ai._nodes
+    elapsed = time.process_time() - started
+    results["search_depth%d" % SEARCH_DEPTH] = {
+        "ns_per_op": elapsed * 1e9 / max(nodes, 1), "nodes_per_sec": nodes / elapsed}
+
+    # get_move 全体（持ち時間を move_time にして、1手あたりの時間と探索ノード数/秒）
+    nodes = 0
+    started = time.process_time()
+    for _, pos, player in corpus:
+        move_ai = MyAI(time_limit=move_time)
+        move_ai.get_move(pos.to_board(), player, (None, None, None))
+        nodes += move_ai._nodes
+    elapsed = time.process_time() - started
+    results["get_move"] = {"ns_per_op": elapsed * 1e9 / len(corpus), "nodes_per_sec": nodes / elapsed}
+    return results
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    """基準値より threshold を超えて遅くなったベンチマーク名の一覧を返す"""
+    regressions = []
+    for name, result in results.items():
+        if name in baseline and result["ns_per_op"] > baseline[name]["ns_per_op"] * (1 + threshold):
+            regressions.append(name)
+    return regressions
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description="MyAI の主要関数のベンチマーク")
+    parser.add_argument("--baseline", help="比較する基準値の JSON ファイル")
+    parser.add_argument("--save-baseline", help="今回の結果を基準値として保存する JSON ファイル")
+    parser.add_argument("--threshold", type=float, default=0.2, help="遅くなったとみなす割合（0.2 = 20%%）")
+    parser.add_argument("--corpus", default="corpus.txt", help="計測に使う corpus.py の局面集ファイル")
+    parser.add_argument("--builtin", action="store_true", help="局面集ファイルの代わりに組み込みの小さな局面集を使う")
+    parser.add_argument("--move-time", type=float, default=0.5, help="get_move ベンチマークの持ち時間（秒）")
+    args = parser.parse_args()
+
+    corpus = build_corpus() if args.builtin else replay_corpus(args.corpus)
+    kinds = {}
+    for kind, _, _ in corpus:
+        kinds[kind] = kinds.get(kind, 0) + 1
+    print("局面集: " + ", ".join(f"{kind} {count}" for kind, count in kinds.items()))
+
+    results = run_benchmarks(corpus, args.move_time)
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    print(f"{'ベンチマーク':<22}{'ns/op':>14}{'nodes/s':>12}{'基準比':>10}")
+    for name, result in results.items():
+        nodes = f"{result['nodes_per_sec']:.0f}" if "nodes_per_sec" in result else "-"
+        ratio = f"{result['ns_per_op'] / baseline[name]['ns_per_op']:.2f}x" if name in baseline else "-"
+        print(f"{name:<22}{result['ns_per_op']:>14.0f}{nodes:>12}{ratio:>10}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"基準値を {args.save_baseline} に保存しました")
+
+    if baseline:
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"❌ {args.threshold * 100:.0f}% を超えて遅くなりました: {', '.join(regressions)}")
+            sys.exit(1)
+        print("✅ 基準値からの大きな劣化はありません")
+
+
+if __name__ == "__main__":
+    main_cli()
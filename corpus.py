@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+局面集（コーパス）の生成・読み込みツール
+交互に合法手を打って実際に現れうる局面を作り、正規化キーで重複を除いてファイルに保存する
+
+使い方:
+  python corpus.py --mode random --count 200 --output corpus.txt
+  python corpus.py --mode weighted --count 200 --output corpus.txt --append
+  python corpus.py --mode selfplay --logs run.jsonl --output corpus.txt --append
+  python corpus.py --summary corpus.txt
+mode は random（一様な合法手）、weighted（MyAI の静的評価の順位で重み付け）、
+selfplay（arena.py の --results に記録された対局の棋譜）。手番側に即勝ちがあるか、相手の勝ちマスを
+受けきれない局面はすでに決着しているので含めない（get_move は探索せずに返すため）。
+1局面は先手・後手の石のビットボード（64ビット整数2つ）で1行に書き、局面の段階と
+戦術的な特徴のタグを添える。手番は石の数から決まる。
+"""
+
+import argparse
+import json
+import random
+from typing import Iterator, List, Tuple
+
+import local_framework  # noqa: F401  main より先に読み込む
+
+from main import BitBoard, MyAI, popcount
+
+OPENING_MAX_STONES = 12  # これ未満の石数の局面は序盤
+ENDGAME_MIN_STONES = 40  # これ以上の石数の局面は終盤（その間は中盤）
+MAX_ATTEMPTS = 100  # 1局面あたりに試す対局数の上限（重複ばかりで局面が増えない場合の打ち切り）
+
+Entry = Tuple[BitBoard, int, str, List[str]]  # (盤面, 手番, 段階, タグ)
+
+
+def is_decided(ai: MyAI, pos: BitBoard, player: int) -> bool:
+    """手番側に即勝ちがあるか、相手の勝ちマスが2つ以上今すぐ置ける（受けきれない）局面か"""
+    playable = ai.playable_cells(pos)
+    if ai.threat_cells(pos, player) & playable:
+        return True
+    opponent_wins = ai.threat_cells(pos, 3 - player) & playable
+    return opponent_wins & (opponent_wins - 1) != 0
+
+
+def play_random_position(rng: random.Random, ai: MyAI, stones: int, weighted: bool = False) -> Tuple[BitBoard, int]:
+    """交互に合法手を打って、決着していない stones 個の石の局面を作る
+
+    相手の勝ちマスが今すぐ置ければ必ず受け、途中で決着した局面（is_decided）になったら作り直す。
+    weighted=True のときは次に相手が勝つ手（真上に相手の勝ちマスがある列）を避けられる限り避け、
+    残りから静的評価の順位が k 位の手を 1/k の重みで選ぶ（実戦に近い局面になる）。
+    """
+    while True:
+        pos = BitBoard()
+        player = 1
+        for _ in range(stones):
+            if is_decided(ai, pos, player):
+                break
+            block = ai.find_winning_move(pos, 3 - player)
+            if block:
+                x, y = block
+            elif weighted:
+                legal_moves = ai.get_legal_moves(pos)
+                losing_moves = ai.find_losing_moves(legal_moves, ai.find_opponent_threat_cells(pos, player))
+                moves = [(x, y) for _, x, y, _ in ai.score_moves(pos, player, legal_moves)]
+                moves = [move for move in moves if move not in losing_moves] or moves
+                x, y = rng.choices(moves, weights=[1 / rank for rank in range(1, len(moves) + 1)])[0]
+            else:
+                x, y, _ = rng.choice(ai.get_legal_moves(pos))
+            pos.place(x, y, player)
+            player = 3 - player
+        else:
+            if not is_decided(ai, pos, player):
+                return pos, player
+
+
+def replay_logs(paths: List[str]) -> Iterator[Tuple[BitBoard, int]]:
+    """arena.py の結果ファイル（JSONL）の棋譜から、決着していない局面（is_decided）を順に返す"""
+    ai = MyAI()
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                pos = BitBoard()
+                player = 1
+                for x, y in json.loads(line).get("moves", []):
+                    z = pos.heights[x + 4 * y]
+                    if ai.completes_line(pos, x, y, z, player):
+                        break
+                    pos.place(x, y, player)
+                    player = 3 - player
+                    if not is_decided(ai, pos, player):
+                        yield pos.copy(), player
+
+
+def phase_of(pos: BitBoard) -> str:
+    """石の数から局面の段階（opening / midgame / endgame）を返す"""
+    stones = popcount(pos.stones[1] | pos.stones[2])
+    if stones < OPENING_MAX_STONES:
+        return "opening"
+    if stones < ENDGAME_MIN_STONES:
+        return "midgame"
+    return "endgame"
+
+
+def tactical_tags(ai: MyAI, pos: BitBoard, player: int) -> List[str]:
+    """手番側から見た戦術的な特徴のタグを返す（決着していない局面が前提）
+
+    block: 相手の勝ちマスを受ける必要がある / zugzwang: 相手の追従策で負けが確定している /
+    quiet: どれにも当たらない
+    """
+    tags = []
+    if ai.find_winning_move(pos, 3 - player):
+        tags.append("block")
+    if ai.is_zugzwang_loss(pos, player):
+        tags.append("zugzwang")
+    return tags or ["quiet"]
+
+
+def from_masks(first: int, second: int) -> Tuple[BitBoard, int]:
+    """先手・後手の石のビットボードから盤面と手番を復元する"""
+    pos = BitBoard()
+    for column in range(16):
+        for z in range(4):
+            bit = 1 << (column + 16 * z)
+            if first & bit:
+                pos.place(column % 4, column // 4, 1)
+            elif second & bit:
+                pos.place(column % 4, column // 4, 2)
+            else:
+                break
+    player = 1 if popcount(first) == popcount(second) else 2
+    return pos, player
+
+
+def format_entry(entry: Entry) -> str:
+    """1局面を「先手の石 後手の石 段階 タグ」の1行にする"""
+    pos, _, phase, tags = entry
+    return f"0x{pos.stones[1]:016x} 0x{pos.stones[2]:016x} {phase} {','.join(tags)}"
+
+
+def load_corpus(path: str) -> List[Entry]:
+    """局面集ファイルを読み込む（# で始まる行は注釈）"""
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            first, second, phase, tags = line.split()
+            pos, player = from_masks(int(first, 16), int(second, 16))
+            entries.append((pos, player, phase, tags.split(",")))
+    return entries
+
+
+def save_corpus(path: str, entries: List[Entry]) -> None:
+    """局面集をファイルに書き込む"""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("# 先手の石 後手の石 段階 タグ（ビットの位置は x + 4y + 16z、手番は石の数から決まる）\n")
+        for entry in entries:
+            f.write(format_entry(entry) + "\n")
+
+
+def add_position(ai: MyAI, entries: List[Entry], seen: set, pos: BitBoard, player: int) -> bool:
+    """重複していなければ段階とタグを付けて局面集に加える（加えたら True）"""
+    key, _ = pos.canonical_key(player)
+    if key in seen:
+        return False
+    seen.add(key)
+    entries.append((pos, player, phase_of(pos), tactical_tags(ai, pos, player)))
+    return True
+
+
+def generate(entries: List[Entry], mode: str, count: int, seed: int,
+             min_stones: int, max_stones: int, logs: List[str]) -> int:
+    """mode の方法で局面を最大 count 個生成して entries に追加し、追加した数を返す"""
+    ai = MyAI()
+    seen = {pos.canonical_key(player)[0] for pos, player, _, _ in entries}
+    added = 0
+    if mode == "selfplay":
+        for pos, player in replay_logs(logs):
+            stones = popcount(pos.stones[1] | pos.stones[2])
+            if min_stones <= stones <= max_stones and add_position(ai, entries, seen, pos, player):
+                added += 1
+                if added >= count:
+                    break
+        return added
+
+    rng = random.Random(seed)
+    attempts = 0
+    while added < count and attempts < count * MAX_ATTEMPTS:
+        attempts += 1
+        pos, player = play_random_position(rng, ai, rng.randint(min_stones, max_stones), mode == "weighted")
+        if add_position(ai, entries, seen, pos, player):
+            added += 1
+    return added
+
+
+def summarize(entries: List[Entry]) -> str:
+    """段階ごと・タグごとの局面数を表示用の文字列にする"""
+    phases, tags = {}, {}
+    for _, _, phase, entry_tags in entries:
+        phases[phase] = phases.get(phase, 0) + 1
+        for tag in entry_tags:
+            tags[tag] = tags.get(tag, 0) + 1
+    return (f"{len(entries)} 局面 / 段階: " + ", ".join(f"{k} {v}" for k, v in phases.items())
+            + " / タグ: " + ", ".join(f"{k} {v}" for k, v in sorted(tags.items(), key=lambda item: -item[1])))
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description="実戦に現れうる局面集を生成・確認する")
+    parser.add_argument("--mode", choices=("random", "weighted", "selfplay"), default="random", help="局面の作り方")
+    parser.add_argument("--count", type=int, default=200, help="生成する局面数の上限")
+    parser.add_argument("--seed", type=int, default=0, help="random / weighted の乱数シード")
+    parser.add_argument("--min-stones", type=int, default=0, help="局面の石数の下限")
+    parser.add_argument("--max-stones", type=int, default=56, help="局面の石数の上限")
+    parser.add_argument("--logs", nargs="*", default=[], help="selfplay で読む arena.py の結果ファイル")
+    parser.add_argument("--output", default="corpus.txt", help="書き込む局面集ファイル")
+    parser.add_argument("--append", action="store_true", help="既存の局面集に重複しない局面だけ追加する")
+    parser.add_argument("--summary", metavar="FILE", help="生成せずに局面集の内訳を表示する")
+    args = parser.parse_args()
+
+    if args.summary:
+        print(summarize(load_corpus(args.summary)))
+        return
+    if args.mode == "selfplay" and not args.logs:
+        parser.error("--mode selfplay には --logs が必要です")
+
+    entries = load_corpus(args.output) if args.append else []
+    added = generate(entries, args.mode, args.count, args.seed, args.min_stones, args.max_stones, args.logs)
+    save_corpus(args.output, entries)
+    print(f"✅ {added} 局面を追加して {args.output} に書き込みました: {summarize(entries)}")
+
+
+if __name__ == "__main__":
+    main_cli()
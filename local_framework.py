@@ -0,0 +1,11 @@
+"""
+ローカルツール共通の準備
+main.py は提出環境の framework モジュールを読み込むので、ローカルでは local_driver で代用する。
+main を読み込むスクリプトは、main より先にこのモジュールを import する。
+"""
+
+import sys
+
+import local_driver
+
+sys.modules.setdefault("framework", local_driver)
@@ -1,13 +1,787 @@
+import math
+import random
+import time
 from typing import List, Tuple
 # from local_driver import Alg3D, Board # ローカル検証用
 from framework import Alg3D, Board # 本番用
 
+# 13方向の直線（正負の対は片方のみ）
+DIRECTIONS = [
+    (1, 0, 0),   # x軸方向
+    (0, 1, 0),   # y軸方向
+    (0, 0, 1),   # z軸方向
+    (1, 1, 0),   # xy対角線
+    (1, 0, 1),   # xz対角線
+    (0, 1, 1),   # yz対角線
+    (1, 1, 1),   # xyz対角線
+    (1, -1, 0),  # xy逆対角線
+    (1, 0, -1),  # xz逆対角線
+    (0, 1, -1),  # yz逆対角線
+    (1, -1, -1), # xyz逆対角線
+    (1, 1, -1),  # xy正、z負対角線
+    (1, -1, 1),  # xy負、z正対角線
+]
+
+
+def _build_win_lines() -> List[Tuple[int, int, int, int]]:
+    """4x4x4 の勝利ライン（76本）をセル番号 x + 4*y + 16*z のタプルで列挙する"""
+    lines = []
+    for dx, dy, dz in DIRECTIONS:
+        for z in range(4):
+            for y in range(4):
+                for x in range(4):
+                    # 始点: 1つ手前が盤外で、3つ先が盤内のセル
+                    if 0 <= x - dx < 4 and 0 <= y - dy < 4 and 0 <= z - dz < 4:
+                        continue
+                    if not (0 <= x + 3*dx < 4 and 0 <= y + 3*dy < 4 and 0 <= z + 3*dz < 4):
+                        continue
+                    lines.append(tuple(
+                        (x + i*dx) + 4 * (y + i*dy) + 16 * (z + i*dz) for i in range(4)
+                    ))
+    return lines
+
+
+# 勝利ライン表（インポート時に一度だけ計算）
+WIN_LINES = _build_win_lines()
+FULL_MASK = (1 << 64) - 1
+EVEN_LAYER_MASK = sum(0xFFFF << (16 * z) for z in (0, 2))  # z = 0, 2 の段（追従策で先に打つ側が取る段）
+ODD_LAYER_MASK = FULL_MASK ^ EVEN_LAYER_MASK  # z = 1, 3 の段（追従策で打ち返す側が取る段）
+LINE_MASKS = [sum(1 << cell for cell in line) for line in WIN_LINES]
+# セル番号 → そのセルを通る勝利ライン番号（4〜7本）
+CELL_LINES = [
+    tuple(index for index, line in enumerate(WIN_LINES) if cell in line)
+    for cell in range(64)
+]
+BOTTOM_LAYER_MASK = 0xFFFF  # z = 0 の段
+CELL_MOVES = [(cell % 4, cell // 4 % 4, cell // 16) for cell in range(64)]  # セル番号 → 手 (x, y, z)（合法手の生成で使い回す）
+
+
+def _build_line_shifts() -> List[Tuple[int, int, int, int]]:
+    """勝利ラインをセル番号の間隔ごとにまとめ、(間隔, 2倍, 3倍, 始点のビットマスク) の表を作る
+
+    どの勝利ラインもセル番号を昇順に並べると等間隔で、13方向がそれぞれ異なる間隔になる。
+    始点のビットだけを見れば、シフトで揃えた4マスは必ず同じライン上にある。
+    """
+    starts = {}
+    for line in WIN_LINES:
+        cells = sorted(line)
+        step = cells[1] - cells[0]
+        starts[step] = starts.get(step, 0) | 1 << cells[0]
+    return [(step, 2 * step, 3 * step, mask) for step, mask in sorted(starts.items())]
+
+
+LINE_SHIFTS = _build_line_shifts()  # 13方向分
+
+
+# 探索で使う定数
+WIN_SCORE = 1000000.0  # 手番側が即座に勝てる局面の評価値
+LOOKAHEAD_DISCOUNT = 0.9  # 相手の応手の評価値に掛ける割引率（従来の先読み減点と同じ）
+WIN_THRESHOLD = WIN_SCORE / 100  # これを超える評価値は勝敗が確定している
+TIME_LIMIT = 2.0  # 1手あたりに使うCPU時間の基準（秒）。不安定な局面では TIME_EXTENSION 倍まで延長する。サーバの制限は約3秒
+TIME_CHECK_INTERVAL = 128  # 何ノードごとに経過時間を確認するか
+TOTAL_TIME_LIMIT = None  # 1局全体で使えるCPU時間（秒）。サーバの制限が1手ごとなら None
+TOTAL_TIME_MOVE_SHARE = 0.25  # 1局全体の制限があるとき、残り時間のうち1手に使ってよい最大の割合
+MIN_MOVE_TIME = 0.05  # 残り時間が少なくても1手に使うCPU時間（秒）
+SOFT_TIME_SHARES = ((12, 0.75), (40, 1.0), (65, 0.75))  # (石数がこれ未満なら, time_limit のうち通常使う割合)
+TIME_EXTENSION = 1.25  # 局面が不安定なときに延長できる time_limit の倍率（2.5秒でもサーバの約3秒に収まる）
+SCORE_DROP_MARGIN = 100.0  # 2つ前の深さより評価値がこれ以上下がったら探索を延長する（奇数・偶数の深さで評価値が揺れるため）
+MAX_PLY = 64  # キラー手を記録する手数の上限（盤面は64マスなので探索はこれより深くならない）
+PVS_EPSILON = 1e-6  # PVS のヌルウィンドウの幅（評価値の刻みより十分小さい値）
+ASPIRATION_WINDOW = 100.0  # アスピレーションウィンドウの初期の片側の幅
+ASPIRATION_MAX_WINDOW = 800.0  # 片側の幅がこれを超えたらその側は窓を開ける
+THREAT_NODE_BUDGET = 5000  # 連続リーチ探索で調べる最大ノード数
+THREAT_MAX_DEPTH = 16  # 連続リーチ探索で読む自分の手の最大数
+ENDGAME_EMPTY_THRESHOLD = 20  # 空きマスがこれ未満なら終盤ソルバーで勝敗を読み切る
+ENDGAME_WIN = 1000  # 終盤ソルバーの勝ちの評価値（ここから決着までの手数を引く）
+ENDGAME_TIME_SHARE = 0.5  # 終盤ソルバーに使う残り時間の割合（読み切れなければ通常探索へ）
+ZUGZWANG_SCORE = WIN_SCORE / 10  # 相手の追従策で負けが確定した局面の評価値の大きさ（即負けより小さい）
+PARITY_THREAT_BONUS = 40  # 偶奇が自分に有利な段に浮いたリーチを作る手の加点
+SEARCH_MODE = "alphabeta"  # 探索の方式（"alphabeta": 反復深化αβ探索 / "mcts": モンテカルロ木探索）
+MCTS_C_PUCT = 1.5  # PUCT の探索項の係数（大きいほど事前確率の高い未訪問の手を試す）
+MCTS_PRIOR_TEMPERATURE = 25.0  # 静的評価点から事前確率を作るソフトマックスの温度（点数差がこの値で 1/e 倍）
+
+
+# Zobristハッシュ用の乱数表（シード固定で毎回同じ値になる）
+_zobrist_rng = random.Random(0x5EED3D4)
+ZOBRIST = [None] + [[_zobrist_rng.getrandbits(64) for _ in range(64)] for _ in range(2)]
+SIDE_KEYS = [0, 0, _zobrist_rng.getrandbits(64)]  # 手番（後手番のときだけ混ぜる）
+
+
+def _build_symmetries() -> List[List[int]]:
+    """重力方向（z）を保つ対称変換ごとの列の対応表を作る
+
+    4x4x4の勝利ラインを保つ変換は全部で192通りあるが、z の層を動かさない
+    （重力と両立する）のは xy 平面の回転・鏡映の8通りだけ。内外入れ替え
+    （0↔1, 2↔3）は3軸同時に適用しないとラインが崩れるため使えない。
+    """
+    transforms = [
+        lambda x, y: (x, y),  # 恒等
+        lambda x, y: (3 - y, x),  # 90度回転
+        lambda x, y: (3 - x, 3 - y),  # 180度回転
+        lambda x, y: (y, 3 - x),  # 270度回転
+        lambda x, y: (3 - x, y),  # x 方向の鏡映
+        lambda x, y: (x, 3 - y),  # y 方向の鏡映
+        lambda x, y: (y, x),  # 対角線での鏡映
+        lambda x, y: (3 - y, 3 - x),  # 反対角線での鏡映
+    ]
+    columns = []
+    for transform in transforms:
+        mapped = []
+        for column in range(16):
+            x, y = transform(column % 4, column // 4)
+            mapped.append(x + 4 * y)
+        columns.append(mapped)
+    return columns
+
+
+SYMMETRY_COLUMNS = _build_symmetries()  # [変換番号][列] -> 変換後の列
+SYMMETRY_COUNT = len(SYMMETRY_COLUMNS)
+INVERSE_SYMMETRY = [
+    next(t for t in range(SYMMETRY_COUNT) if all(SYMMETRY_COLUMNS[t][SYMMETRY_COLUMNS[s][c]] == c for c in range(16)))
+    for s in range(SYMMETRY_COUNT)
+]
+# [変換番号][列] -> 変換後の手 (x, y)
+SYMMETRY_MOVES = [[(column % 4, column // 4) for column in mapped] for mapped in SYMMETRY_COLUMNS]
+# セルごとの「各対称変換を施した盤面」でのZobrist値（変換0は ZOBRIST そのもの）
+SYMMETRY_ZOBRIST = [None] + [
+    [
+        tuple(ZOBRIST[player][SYMMETRY_COLUMNS[s][index % 16] + index // 16 * 16] for s in range(SYMMETRY_COUNT))
+        for index in range(64)
+    ]
+    for player in (1, 2)
+]
+
+
+def transform_move(move: Tuple[int, int], symmetry: int) -> Tuple[int, int]:
+    """手 (x, y) に対称変換を施す（None はそのまま返す）"""
+    if move is None:
+        return None
+    return SYMMETRY_MOVES[symmetry][move[0] + 4 * move[1]]
+
+# 置換表
+TT_SIZE = 1 << 18  # 置換表のエントリ数（メモリ約1GBの制限に対して数十MB程度）
+TT_EXACT = 0  # 正確な評価値
+TT_LOWER = 1  # 下限値（βカットした）
+TT_UPPER = 2  # 上限値（αを超えなかった）
+
+# 定跡: 正規化キー（BitBoard.canonical_key）-> 正規形の盤面で打つ列 (x + 4*y)
+# make_book.py が序盤の局面を時間をかけて探索して生成する（マーカーの間は手で編集しない）
+# === OPENING BOOK BEGIN ===
+OPENING_BOOK = {
+    0x0000000000000000: 15,
+    0x00009796cafb05c2: 9,
+    0x00b502533e214ccf: 12,
+    0x0153e9306b05d538: 5,
+    0x015a9bf615c5ce9a: 8,
+    0x018ec099099e39fb: 6,
+    0x026f22442fb15d6c: 6,
+    0x029fa249aaa9a189: 3,
+    0x02e7253790ef74af: 5,
+    0x02ffd0145be40283: 8,
+    0x0307ce63a13d7c27: 9,
+    0x03094ee08273d423: 3,
+    0x030fa0a12cad3218: 3,
+    0x03792ee71e3be962: 4,
+    0x0394acaf97918d1c: 3,
+    0x03ea4c2b28971859: 4,
+    0x043a3c9395d26258: 3,
+    0x0444dc172ad4f71d: 7,
+    0x04b77d7561cd3366: 6,
+    0x05313275a8ea4ecd: 3,
+    0x055804268c0493ae: 10,
+    0x05b2571ea00dc6b0: 3,
+    0x05dcb03d21402ab3: 9,
+    0x066e7c0dbe5c1a5b: 12,
+    0x0782d138ea6fdb09: 9,
+    0x0788976eeb7883ac: 5,
+    0x07993878b758c4ab: 12,
+    0x07a93f5f4cc113a7: 10,
+    0x0865356dded72f88: 14,
+    0x08af9c6dac7f2ff7: 9,
+    0x08bc33645048a4a7: 12,
+    0x08bcc02581241c41: 10,
+    0x08f34cbd753c61e4: 7,
+    0x09761f04e9553634: 11,
+    0x09def8186313fd2a: 12,
+    0x09e0f607f5d6beb7: 13,
+    0x0ac4aa4a2e96881f: 9,
+    0x0aca9b68b9b3e539: 3,
+    0x0b354192b5874df0: 7,
+    0x0bd78023191491a3: 14,
+    0x0c0633e1a226fb8b: 10,
+    0x0c7653e63e6ec6ca: 6,
+    0x0cbeaafc6f1e1871: 11,
+    0x0cd99bbb52460095: 3,
+    0x0d23060861d8608f: 3,
+    0x0d36c7b107b74de6: 14,
+    0x0d640b54bbf00a7d: 10,
+    0x0e8472ffc074f3cd: 10,
+    0x0ea2067b7b4b2669: 6,
+    0x0ea8402d7a5c7ecc: 5,
+    0x0f01b195eb7562f2: 5,
+    0x0f3b9779702b4c2b: 5,
+    0x0f98edb2dd1254d9: 8,
+    0x0f9a576a3c39dac6: 1,
+    0x10b85bad8463d065: 6,
+    0x10c64d8a12bf83c9: 8,
+    0x10d91ae9b36471c8: 5,
+    0x1221ff2b48abf2a4: 13,
+    0x12705354554d8442: 10,
+    0x1277435a8c2b9013: 10,
+    0x135daf152aeac31f: 12,
+    0x1459e49e606f18ca: 12,
+    0x14ab2d0ad530d2d6: 3,
+    0x1563b73cccac04ee: 7,
+    0x1586d14baa97958b: 3,
+    0x15f7e86970aec8c6: 2,
+    0x186dd3463ce966f9: 2,
+    0x190bc388d345ead6: 10,
+    0x197beb71d33c7b39: 10,
+    0x19d236c08cb6d91f: 10,
+    0x1a0c417461f76332: 3,
+    0x1a60838e4b756734: 9,
+    0x1be8eec323dc32a3: 6,
+    0x1d9ff8c63c2838e3: 6,
+    0x1db9850f5f42a3bf: 8,
+    0x1e88bc272fd1d7f8: 12,
+    0x1e8c94d4224ababc: 5,
+    0x1ea5ee70944fa7d3: 9,
+    0x1eb6b238b9149465: 5,
+    0x1f3e7eae59da35ed: 5,
+    0x1fea775b1c8a8e75: 4,
+    0x1fea841acde63693: 5,
+    0x20f7f358c0cd8c48: 0,
+    0x2102a0a0e12fe20c: 0,
+    0x22677a114560e841: 10,
+    0x228445d45521e9bf: 4,
+    0x22faa550ea277cfa: 12,
+    0x236d15720465baa2: 9,
+    0x2431dca954115328: 6,
+    0x2542a0b0df75e302: 10,
+    0x26f83a0888073153: 9,
+    0x270eb10102de00fe: 9,
+    0x289ded35311e6640: 5,
+    0x293fb8d3a454313f: 9,
+    0x29d23a9b2dfe5541: 3,
+    0x2a8d74e33b4801d7: 12,
+    0x2ba49297c40514df: 5,
+    0x2bc21e8962e19097: 13,
+    0x2c6c337125ebdd92: 14,
+    0x2e339d9a6341a4d5: 12,
+    0x2e7caaa72fbdba05: 10,
+    0x30dd04ee12d75ad4: 10,
+    0x314c7dcf86354dc4: 13,
+    0x322b45728686bea4: 2,
+    0x3255a5f639802be1: 5,
+    0x33098cf448f22d1f: 5,
+    0x341a84fd05ffb15d: 14,
+    0x342f1bbbf5efeb98: 5,
+    0x346bbddfdfc6ec10: 12,
+    0x35ac122e7789eece: 11,
+    0x35d2f2aac88f7b8b: 10,
+    0x370be62da6c8292f: 6,
+    0x3760beab0cea6830: 15,
+    0x38baec70e57b0346: 12,
+    0x3aece3b7a3c4bcc3: 7,
+    0x3bd3b19d1a27e13b: 0,
+    0x3e61922e650655d2: 3,
+    0x3e847ea4613c7f93: 12,
+    0x3f308956a11e9bdf: 6,
+    0x41606ec9729ebb07: 5,
+    0x416ef445858b136f: 15,
+    0x4579ac64dcb282d0: 7,
+    0x4672e7f46616dd63: 15,
+    0x46e739958391eb6d: 10,
+    0x497d9af54643f2cb: 7,
+    0x4b75735847c6af65: 6,
+    0x4b8fcb2e7a898f4e: 14,
+    0x4bba0c325ca38249: 6,
+    0x4e22d009cbe22e8c: 3,
+    0x51e5aa07aa31391b: 15,
+    0x58d19c4596b5d226: 5,
+    0x598fb46a5be2d313: 2,
+    0x5a896f3b54c02a66: 5,
+    0x5d854a7293d5bf8c: 8,
+    0x6502927a2d340197: 6,
+    0x6de51c872a3bba51: 13,
+    0x80d1574488028242: 12,
+    0x87509311e0983caf: 9,
+    0x89b77025b8f792a2: 10,
+    0x8b020113f3280e9c: 10,
+    0x8da94920f4ae0e4a: 3,
+    0x8f9b3fa64a799bef: 5,
+    0x9644791a00a5fb83: 0,
+    0x9882372773eef878: 15,
+    0x995889651b89c72d: 5,
+    0x9bc2827fd3280fc0: 5,
+    0x9d0eff70d2ab89e8: 15,
+    0x9ed7c930f4292813: 10,
+    0x9f0135414969efff: 10,
+    0x9f1a4e55d566833b: 12,
+    0xa13738c6f1c6c614: 3,
+    0xa18147d93a6be475: 5,
+    0xa1b140fec1f23379: 6,
+    0xa30cfee4e3bd25d6: 5,
+    0xa3e86b34772c154d: 10,
+    0xa4569c2827878961: 6,
+    0xa59acdc8b16949f9: 9,
+    0xa6e3ed1e6c58155f: 6,
+    0xa7c3e60207b76fcd: 3,
+    0xa9e9c70d55aeb164: 15,
+    0xaabcc39f93671ca8: 0,
+    0xab0e373424b64dcc: 3,
+    0xabaae30f1e68c8c7: 0,
+    0xabc5d5e3a5919446: 10,
+    0xac5c94e54a16de2e: 9,
+    0xacd6f69f244eb4a9: 10,
+    0xae1fb0e701d0a78d: 15,
+    0xaf3eb8703c693ea8: 15,
+    0xafee58d5d50aeec6: 12,
+    0xb055a87a9dc66802: 10,
+    0xb53703b4df4a4ee3: 9,
+    0xb59b8c9d48fe711c: 12,
+    0xb6831e0f44d826f0: 12,
+    0xb80899f8a9e0a11a: 10,
+    0xb84967dbc797196d: 9,
+    0xb8b669eb31709999: 5,
+    0xb9fb937070464809: 10,
+    0xbb268e50ee6cd62f: 11,
+    0xbe7e8afe9989551c: 3,
+    0xbf0f4db48637e1d0: 5,
+    0xbf401e01650e8f70: 9,
+    0xcfabe02fd85c474b: 8,
+    0xd5c940180a711665: 15,
+    0xe68f9aa895014b70: 5,
+    0xe869c909cebc3043: 12,
+    0xeee95f569704964a: 9,
+}
+# === OPENING BOOK END ===
+
+
+def popcount(value: int) -> int:
+    """立っているビット数を返す（Python 3.9 互換のため int.bit_count は使わない）"""
+    return bin(value).count("1")
+
+
+def threat_mask(stones: int, empty: int) -> int:
+    """stones の石に1つ加えると4つ揃う空きマス（empty の中）のビットマスクを返す
+
+    方向ごとにライン上の4マスをシフトで始点に揃え、3マスが石で埋まっているラインの
+    残り1マスを元の位置に戻す。76本のラインを1本ずつ見る代わりに13回のビット演算で済む。
+    """
+    threats = 0
+    for step, step2, step3, starts in LINE_SHIFTS:
+        a = stones & starts
+        b = stones >> step & starts
+        c = stones >> step2 & starts
+        d = stones >> step3 & starts
+        threats |= b & c & d | (a & c & d) << step | (a & b & d) << step2 | (a & b & c) << step3
+    return threats & empty
+
+
+def playable_mask(occupied: int) -> int:
+    """今すぐ石を置けるマス（最下段か、真下が埋まっている空きマス）のビットマスクを返す"""
+    return (occupied << 16 | BOTTOM_LAYER_MASK) & ~occupied & FULL_MASK
+
+
+def random_bit(mask: int) -> int:
+    """mask の立っているビットから1つを一様に選んで返す（mask は0以外）"""
+    for _ in range(random.randrange(popcount(mask))):
+        mask &= mask - 1
+    return mask & -mask
+
+
+class SearchTimeout(Exception):
+    """探索中に制限時間を超えたことを知らせる例外"""
+
+
+class BitBoard:
+    """立体四目並べの内部盤面表現（ビットボード版）
+
+    各プレイヤーの石を64bit整数で保持する。セル (x, y, z) はビット番号
+    x + 4*y + 16*z に対応し、列 (x, y) は番号 x + 4*y で表す。
+    列ごとの高さは16要素の配列で持ち、石を置く/取り除くたびに差分更新する。
+    今すぐ置けるマス（各列の次に石が落ちるマス）もビットマスクで持ち、同様に差分更新する。
+    さらに76本の勝利ラインごとに各プレイヤーの石数を保持し、置いた/取り除いた
+    セルを通るライン（4〜7本）だけを更新する。
+    Zobristハッシュは重力を保つ8通りの対称変換それぞれについて差分更新し、
+    その最小値を対称な局面で共通の正規化キーとして使う。
+    """
+
+    __slots__ = ("stones", "heights", "playable", "line_counts", "hashes")
+
+    def __init__(self) -> None:
+        self.stones = [0, 0, 0]  # [未使用, 先手(黒), 後手(白)]
+        self.heights = [0] * 16  # 列ごとの次に石が落ちる z（4 = 満杯）
+        self.playable = BOTTOM_LAYER_MASK  # 今すぐ置けるマスのビットマスク（満杯の列はビットなし）
+        # ライン番号ごとの石数 [未使用, 先手の石数, 後手の石数]
+        self.line_counts = [None, [0] * len(WIN_LINES), [0] * len(WIN_LINES)]
+        # 対称変換ごとの石の配置のZobristハッシュ（差分更新、0番が変換なしの盤面）
+        self.hashes = [0] * SYMMETRY_COUNT
+
+    @classmethod
+    def from_board(cls, board: Board) -> "BitBoard":
+        """get_move に渡された盤面から一度だけ構築する"""
+        pos = cls()
+        for z in range(4):
+            for y in range(4):
+                for x in range(4):
+                    value = board[z][y][x]
+                    if value:
+                        pos.stones[value] |= 1 << (x + 4 * y + 16 * z)
+        for y in range(4):
+            for x in range(4):
+                height = 0
+                while height < 4 and board[height][y][x] != 0:
+                    height += 1
+                pos.heights[x + 4 * y] = height
+        pos.playable = playable_mask(pos.stones[1] | pos.stones[2])
+        for player in (1, 2):
+            stones = pos.stones[player]
+            counts = pos.line_counts[player]
+            for line, mask in enumerate(LINE_MASKS):
+                counts[line] = popcount(stones & mask)
+            for index in range(64):
+                if stones >> index & 1:
+                    keys = SYMMETRY_ZOBRIST[player][index]
+                    pos.hashes = [h ^ k for h, k in zip(pos.hashes, keys)]
+        return pos
+
+    def to_board(self) -> Board:
+        """get_move に渡す形式の3次元リスト board[z][y][x] に戻す（ローカルのツール用）"""
+        return [[[self.cell(x, y, z) for x in range(4)] for y in range(4)] for z in range(4)]
+
+    def copy(self) -> "BitBoard":
+        """独立した複製を返す（探索を途中で打ち切っても元の盤面を壊さないため）"""
+        pos = BitBoard.__new__(BitBoard)
+        pos.stones = self.stones[:]
+        pos.heights = self.heights[:]
+        pos.playable = self.playable
+        pos.line_counts = [None, self.line_counts[1][:], self.line_counts[2][:]]
+        pos.hashes = self.hashes[:]
+        return pos
+
+    def cell(self, x: int, y: int, z: int) -> int:
+        """セルの値を返す（0: 空, 1: 先手, 2: 後手）"""
+        bit = 1 << (x + 4 * y + 16 * z)
+        if self.stones[1] & bit:
+            return 1
+        if self.stones[2] & bit:
+            return 2
+        return 0
+
+    def place(self, x: int, y: int, player: int) -> int:
+        """列 (x, y) に石を落とし、置いた z を返す"""
+        column = x + 4 * y
+        z = self.heights[column]
+        index = column + 16 * z
+        bit = 1 << index
+        self.stones[player] |= bit
+        self.heights[column] = z + 1
+        self.playable ^= bit | bit << 16 & FULL_MASK  # 置いたマスが埋まり、真上が置けるようになる
+        self.hashes = [h ^ k for h, k in zip(self.hashes, SYMMETRY_ZOBRIST[player][index])]
+        counts = self.line_counts[player]
+        for line in CELL_LINES[index]:
+            counts[line] += 1
+        return z
+
+    def remove(self, x: int, y: int) -> None:
+        """列 (x, y) の一番上の石を取り除く（place の取り消し）"""
+        column = x + 4 * y
+        z = self.heights[column] - 1
+        self.heights[column] = z
+        index = column + 16 * z
+        bit = 1 << index
+        player = 1 if self.stones[1] & bit else 2
+        self.stones[player] &= ~bit
+        self.playable ^= bit | bit << 16 & FULL_MASK
+        self.hashes = [h ^ k for h, k in zip(self.hashes, SYMMETRY_ZOBRIST[player][index])]
+        counts = self.line_counts[player]
+        for line in CELL_LINES[index]:
+            counts[line] -= 1
+
+    def canonical_key(self, player: int) -> Tuple[int, int]:
+        """対称な局面で共通のキーと、この盤面を正規形に移す変換番号を返す
+
+        手番 player も含めたキーを返す。正規形での手は transform_move(手, 変換番号)、
+        正規形の手を実際の盤面に戻すには INVERSE_SYMMETRY[変換番号] を使う。
+        """
+        hashes = self.hashes
+        key = min(hashes)
+        return key ^ SIDE_KEYS[player], hashes.index(key)
+
+
+class TranspositionTable:
+    """Zobristハッシュの正規化キーをキーとする固定サイズの置換表
+
+    各バケットは2スロットで、0番は深さ優先（より深い探索結果だけが上書き）、
+    1番は常に上書きする。エントリは (キー, 深さ, 種別, 評価値, 最善手, 世代)。
+    対称な局面が同じエントリを共有するよう、最善手は正規形の盤面での手で保存する。
+    1局を通して使い回し、get_move ごとに世代を進める。古い世代のエントリは
+    深さに関係なく優先的に置き換える。
+    """
+
+    __slots__ = ("entries", "mask", "generation", "probes", "hits", "collisions", "overwrites")
+
+    def __init__(self, size: int = TT_SIZE) -> None:
+        buckets = size // 2
+        self.mask = buckets - 1  # バケット数は2のべき乗
+        self.entries = [None] * (buckets * 2)
+        self.generation = 0
+        self.reset_counters()
+
+    def reset_counters(self) -> None:
+        """統計用のカウンタを0に戻す"""
+        self.probes = 0  # 参照回数
+        self.hits = 0  # キーが一致した回数
+        self.collisions = 0  # バケットに別の局面のエントリしかなかった回数
+        self.overwrites = 0  # 別の局面のエントリを上書きした回数
+
+    def new_generation(self) -> None:
+        """新しい探索を始める（これまでのエントリは古い世代になる）"""
+        self.generation += 1
+        self.reset_counters()
+
+    def probe(self, key: int):
+        """キーに一致するエントリを返す（なければ None）"""
+        self.probes += 1
+        index = (key & self.mask) << 1
+        first = self.entries[index]
+        if first is not None and first[0] == key:
+            self.hits += 1
+            return first
+        entry = self.entries[index + 1]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        if first is not None or entry is not None:
+            self.collisions += 1
+        return None
+
+    def store(self, key: int, depth: int, flag: int, score: float, move: Tuple[int, int]) -> None:
+        """探索結果を保存する（深さ優先スロット → 常時上書きスロットの順）"""
+        index = (key & self.mask) << 1
+        entry = self.entries[index]
+        new_entry = (key, depth, flag, score, move, self.generation)
+        if entry is None or entry[0] == key or entry[5] != self.generation or depth >= entry[1]:
+            if entry is not None and entry[0] != key:
+                self.overwrites += 1
+        else:
+            index += 1
+            entry = self.entries[index]
+            if entry is not None and entry[0] != key:
+                self.overwrites += 1
+        self.entries[index] = new_entry
+
+
+class SearchStats:
+    """1回の get_move の探索統計
+
+    探索ノード数と連続リーチ探索のノード数、反復深化の深さごとのノード数と時間、葉の評価回数、βカットの回数と
+    最初の手でカットした割合、置換表の参照・ヒット・衝突・上書きの回数、
+    実効分岐数、読み筋を記録する。手が遅かった原因（手の順序付けが悪い、
+    置換表が入れ替わり続けている、木が大きい）を切り分けるのに使う。
+    """
+
+    __slots__ = ("reason", "nodes", "threat_nodes", "elapsed", "iterations", "leaf_evaluations", "cutoffs",
+                 "first_move_cutoffs", "pvs_researches", "aspiration_researches", "playouts", "reused_visits",
+                 "tt_probes", "tt_hits", "tt_collisions", "tt_overwrites", "pv")
+
+    def __init__(self) -> None:
+        self.reason = ""  # 手を選んだ理由（MyAI._move_reason と同じ）
+        self.nodes = 0  # 探索ノード数（終盤ソルバーを含む）
+        self.threat_nodes = 0  # 連続リーチ探索のノード数（nodes には含まない）
+        self.elapsed = 0.0  # get_move 全体のCPU時間（秒）
+        self.iterations = []  # 反復深化の各深さ (深さ, ノード数, CPU時間, 完了したか)
+        self.leaf_evaluations = 0  # 深さ0の葉で静的評価した回数
+        self.cutoffs = 0  # βカットの回数
+        self.first_move_cutoffs = 0  # 最初に調べた手でβカットした回数
+        self.pvs_researches = 0  # PVS のヌルウィンドウで alpha を超え、窓を広げて読み直した回数
+        self.aspiration_researches = 0  # ルートの評価値がアスピレーションウィンドウを外れて読み直した回数
+        self.playouts = 0  # モンテカルロ木探索のプレイアウト回数
+        self.reused_visits = 0  # 前回の木から引き継いだルートの訪問回数
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.tt_collisions = 0
+        self.tt_overwrites = 0
+        self.pv = []  # 読み筋 [(x, y), ...]
+
+    def add_table(self, table: TranspositionTable) -> None:
+        """置換表のカウンタを統計に加える"""
+        self.tt_probes += table.probes
+        self.tt_hits += table.hits
+        self.tt_collisions += table.collisions
+        self.tt_overwrites += table.overwrites
+
+    def completed_depth(self) -> int:
+        """反復深化で最後に完了した深さ（探索していなければ0）"""
+        completed = [depth for depth, _, _, done in self.iterations if done]
+        return completed[-1] if completed else 0
+
+    def first_move_cutoff_rate(self) -> float:
+        """βカットのうち最初に調べた手で起きた割合（手の順序付けの良さの目安）"""
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def effective_branching_factor(self) -> float:
+        """完了した最後の2つの深さのノード数の比（2つ未満なら0）"""
+        completed = [nodes for _, nodes, _, done in self.iterations if done]
+        if len(completed) < 2 or completed[-2] == 0:
+            return 0.0
+        return completed[-1] / completed[-2]
+
+    def as_dict(self) -> dict:
+        """JSON に書き出せる辞書にする"""
+        return {
+            "reason": self.reason,
+            "nodes": self.nodes,
+            "threat_nodes": self.threat_nodes,
+            "elapsed": self.elapsed,
+            "iterations": [
+                {"depth": depth, "nodes": nodes, "time": seconds, "completed": done}
+                for depth, nodes, seconds, done in self.iterations
+            ],
+            "completed_depth": self.completed_depth(),
+            "leaf_evaluations": self.leaf_evaluations,
+            "cutoffs": self.cutoffs,
+            "first_move_cutoffs": self.first_move_cutoffs,
+            "first_move_cutoff_rate": self.first_move_cutoff_rate(),
+            "pvs_researches": self.pvs_researches,
+            "aspiration_researches": self.aspiration_researches,
+            "playouts": self.playouts,
+            "reused_visits": self.reused_visits,
+            "tt_probes": self.tt_probes,
+            "tt_hits": self.tt_hits,
+            "tt_collisions": self.tt_collisions,
+            "tt_overwrites": self.tt_overwrites,
+            "effective_branching_factor": self.effective_branching_factor(),
+            "pv": [list(move) for move in self.pv],
+        }
+
+
+class TimeManager:
+    """1手ごとに使うCPU時間を決める
+
+    締め切りは2つ。目安（soft）を過ぎたら次の深さを始めず、上限（hard）を過ぎたら
+    探索を打ち切る。目安は局面の段階（石数）で変え、最善手が深さごとに変わる・
+    評価値が大きく下がるなど局面が不安定なときだけ上限（time_limit の TIME_EXTENSION 倍）まで延長する。
+    get_move で使ったCPU時間を累計し、1局全体の制限（total_limit）があれば
+    残り時間を残りの手数で割って配分する（1手ごとの制限しかなければ None）。
+    """
+
+    __slots__ = ("total_limit", "used", "moves", "started", "soft_deadline", "hard_deadline")
+
+    def __init__(self, total_limit: float = TOTAL_TIME_LIMIT) -> None:
+        self.total_limit = total_limit
+        self.used = 0.0  # これまでの get_move で使ったCPU時間の累計（秒）
+        self.moves = 0  # これまでに指した手数
+        self.started = 0.0
+        self.soft_deadline = 0.0
+        self.hard_deadline = 0.0
+
+    def start(self, started: float, move_limit: float, stones: int) -> None:
+        """started（time.process_time() の値）から始まる手の締め切りを決める"""
+        share = next(share for limit, share in SOFT_TIME_SHARES if stones < limit)
+        hard = move_limit * TIME_EXTENSION
+        soft = move_limit * share
+        if self.total_limit is not None:
+            remaining = max(self.total_limit - self.used, 0.0)
+            own_moves = max((64 - stones + 1) // 2, 1)  # 満杯まで続いた場合の自分の残り手数
+            hard = max(min(hard, remaining * TOTAL_TIME_MOVE_SHARE), MIN_MOVE_TIME)
+            soft = remaining / own_moves
+        self.started = started
+        self.hard_deadline = started + hard
+        self.soft_deadline = started + min(soft, hard)
+
+    def finish(self) -> float:
+        """手を返すときに呼び、この手で使ったCPU時間を累計に加えて返す"""
+        elapsed = time.process_time() - self.started
+        self.used += elapsed
+        self.moves += 1
+        return elapsed
+
+    def should_stop(self, iteration_time: float, unstable: bool) -> bool:
+        """次の深さを始めずに探索を終えるか（次の深さは今回の2倍以上かかるとみなす）"""
+        deadline = self.hard_deadline if unstable else self.soft_deadline
+        return time.process_time() + iteration_time * 2 > deadline
+
+
+class MCTSNode:
+    """モンテカルロ木探索の節点（ある手を打った直後の局面）
+
+    value は手を打った側（mover）から見た結果（勝ち1・引き分け0・負け-1）の合計。
+    children は展開するまで None で、置ける手がなければ空リスト。
+    terminal はこの手で4つ揃えて勝った節点だけ 1（決着していなければ None）。
+    """
+
+    __slots__ = ("move", "mover", "prior", "visits", "value", "children", "terminal")
+
+    def __init__(self, move: Tuple[int, int], mover: int, prior: float, terminal: int = None) -> None:
+        self.move = move  # この節点に至る手 (x, y)（ルートでは None）
+        self.mover = mover
+        self.prior = prior  # 親から見たこの手の事前確率
+        self.visits = 0
+        self.value = 0.0
+        self.children = None
+        self.terminal = terminal
+
+    def mean_value(self) -> float:
+        """手を打った側から見た平均の結果（未訪問なら0）"""
+        return self.value / self.visits if self.visits else 0.0
+
+    def select_child(self) -> "MCTSNode":
+        """PUCT（平均の結果 + 事前確率に比例し訪問回数とともに減る探索項）が最大の子を返す"""
+        scale = MCTS_C_PUCT * math.sqrt(self.visits)
+        best, best_score = None, float("-inf")
+        for child in self.children:
+            score = child.mean_value() + scale * child.prior / (1 + child.visits)
+            if score > best_score:
+                best, best_score = child, score
+        return best
+
+    def most_visited_child(self) -> "MCTSNode":
+        """訪問回数が最多の子（同数なら平均の結果が高い方）を返す"""
+        return max(self.children, key=lambda child: (child.visits, child.mean_value()))
+
+
 class MyAI(Alg3D):
-    def __init__(self):
-        """AI初期化（メモリ効率化のためキャッシュを追加）"""
-        self._evaluation_cache = {}  # 評価結果のキャッシュ
-        self._cache_hits = 0
-        self._cache_misses = 0
+    def __init__(self, time_limit: float = TIME_LIMIT, verbose: bool = False, total_time_limit: float = TOTAL_TIME_LIMIT,
+                 search_mode: str = SEARCH_MODE):
+        """AI初期化
+        
+        1局を通して持ち越す状態は、置換表（通常探索用と終盤ソルバー用）、CPU時間の配分（TimeManager）、
+        前回の読み筋とその再利用のための盤面ハッシュ、キラー手とヒストリー、モンテカルロ木探索で
+        選んだ手の部分木。直近の get_move の探索統計は stats に残る。
+        verbose=True のときだけ盤面や各マスの点数などの可視化を表示する。
+        試合では既定の False のままにして、CPU時間を探索だけに使う。
+        total_time_limit を指定すると、1局全体のCPU時間がその値に収まるように配分する。
+        search_mode="mcts" にすると、反復深化αβ探索の代わりにモンテカルロ木探索で手を選ぶ。
+        """
+        if search_mode not in ("alphabeta", "mcts"):
+            raise ValueError(f"未知の探索方式です: {search_mode}")
+        self.verbose = verbose  # 可視化・デバッグ表示の有無
+        self.search_mode = search_mode  # 探索の方式（"alphabeta" / "mcts"）
+        self._tt = TranspositionTable()  # 探索結果の置換表（1局を通して使い回す）
+        self._endgame_tt = TranspositionTable()  # 終盤ソルバー専用の置換表（評価値の単位が異なる）
+        self._pv = []  # 前回の探索の読み筋 [(x, y), ...]（自分の手から）
+        self._pv_depth = 0  # 前回の探索で完了した深さ
+        self._expected_hash = None  # 読み筋どおりに進んだ場合の次の手番での盤面ハッシュ
+        self._start_depth = 1  # 反復深化を始める深さ
+        self._root_hint = None  # ルートで最初に調べる手
+        self._root_scores = {}  # 最後に完了した探索でのルートの各手の評価値 {(x, y): 点数}
+        self._iteration_scores = {}  # 探索中の深さでのルートの各手の評価値
+        self._move_reason = ""  # 直近の手を選んだ理由（"book" / "forced" / "win" / "block" / "endgame" / "threat" / "search" / "mcts" / "fallback"）
+        self._endgame_result = None  # 終盤ソルバーの結果 (勝ち1/引き分け0/負け-1, 決着までの手数)
+        self.time_limit = time_limit  # 1手あたりのCPU時間の上限（秒）
+        self._clock = TimeManager(total_time_limit)  # 1手ごとのCPU時間の配分
+        self._deadline = 0.0  # 探索を打ち切る time.process_time() の値
+        self._nodes = 0  # 探索ノード数（時間確認の間引き用）
+        self._threat_nodes = 0  # 直近の連続リーチ探索のノード数（ノード数の上限の判定用）
+        self._killers = [[None, None] for _ in range(MAX_PLY)]  # ルートからの手数ごとにβカットを起こした手 (x, y)
+        self._history = [None, [0] * 64, [0] * 64]  # プレイヤー・セルごとのβカットの実績（ヒストリー）
+        self.stats = SearchStats()  # 直近の get_move の探索統計
+        self._mcts_tree = None  # 前回のモンテカルロ木探索で選んだ手の節点（相手の応手の部分木を再利用する）
+        self._mcts_hash = None  # その手を打った直後の盤面ハッシュ
+        self._mcts_root = None  # 今回の探索で引き継いだルートの節点
     
     def get_move(
         self,
@@ -15,47 +789,112 @@ class MyAI(Alg3D):
         player: int, # 先手(黒):1 後手(白):2
         last_move: Tuple[int, int, int] # 直前に置かれた場所(x, y, z)
     ) -> Tuple[int, int]:
-        # 可視化: 現在の盤面と置けるマスを表示
-        self.visualize_board(board)
-        self.print_legal_moves(board)
-        
-        # 可視化: 各マスのアクセス可能ライン数を表示
-        self.print_line_accessibility(board, player)
-        
-        # 可視化: 各マスの重み（点数）を表示
-        self.print_position_scores(board, player)
-        
-        # 可視化: 各マスで妨害できる相手の石数を表示
-        self.print_opponent_interference(board, player)
+        # CPU時間の締め切りを設定（盤面変換や表示も含めて計測）
+        started = time.process_time()
+        self._tt.new_generation()
+        self.stats = SearchStats()
+        start_nodes = self._nodes
+        
+        # 盤面を内部表現（ビットボード）に一度だけ変換する
+        pos = BitBoard.from_board(board)
+        self._clock.start(started, self.time_limit, popcount(pos.stones[1] | pos.stones[2]))
+        self._deadline = self._clock.hard_deadline
+        
+        # 相手が読み筋どおりに応じていれば前回の探索結果を引き継ぐ
+        self.reuse_previous_search(pos, player, last_move)
+        self.reuse_mcts_tree(pos, player, last_move)
+        
+        # 定跡に載っている局面なら探索せずにその手を返す
+        book_move = self.probe_book(pos, player)
+        if book_move:
+            self._move_reason = "book"
+            self.finish_stats(book_move, start_nodes)
+            if self.verbose:
+                self.visualize_board(pos)
+                self.print_move_reason(pos, player, book_move)
+            return book_move
+        
+        if self.verbose:
+            # 可視化: 現在の盤面と置けるマスを表示
+            self.visualize_board(pos)
+            self.print_legal_moves(pos)
+            
+            # 可視化: 各マスのアクセス可能ライン数を表示
+            self.print_line_accessibility(pos, player)
+            
+            # 可視化: 各マスで妨害できる相手の石数を表示
+            self.print_opponent_interference(pos, player)
+            
+            # 可視化: 両プレイヤーのリーチと偶奇を表示
+            self.print_threat_analysis(pos, player)
         
         # 基本的なAIアルゴリズムを実装
-        move = self.find_best_move(board, player)
+        move = self.find_best_move(pos, player)
+        self.finish_stats(move, start_nodes)
         
-        # 可視化: AIの選択理由を表示
-        self.print_move_reason(board, player, move)
-        
-        # キャッシュ統計を表示（デバッグ用）
-        total_calls = self._cache_hits + self._cache_misses
-        if total_calls > 0:
-            hit_rate = self._cache_hits / total_calls * 100
-            print(f"\n💾 キャッシュ統計: ヒット率 {hit_rate:.1f}% ({self._cache_hits}/{total_calls})")
+        if self.verbose:
+            # 可視化: 各マスの重み（点数）を表示（探索で計算済みの評価値を使う）
+            self.print_position_scores(pos, player)
+            
+            # 可視化: AIの選択理由を表示
+            self.print_move_reason(pos, player, move)
+            
+            # 探索統計を表示（デバッグ用）
+            self.print_search_stats()
         
         return move
+    
+    def finish_stats(self, move: Tuple[int, int], start_nodes: int) -> None:
+        """get_move の最後に、手を選んだ理由・ノード数・時間・置換表のカウンタを探索統計に記録する"""
+        stats = self.stats
+        stats.reason = self._move_reason
+        stats.nodes = self._nodes - start_nodes
+        stats.elapsed = self._clock.finish()
+        stats.add_table(self._tt)
+        if not stats.pv and move:
+            stats.pv = [move]
+    
+    def get_search_stats(self) -> dict:
+        """直近の get_move の探索統計を辞書で返す（自己対戦アリーナでの集計用）"""
+        return self.stats.as_dict()
+    
+    def print_search_stats(self) -> None:
+        """直近の get_move の探索統計を表示する"""
+        stats = self.stats
+        print(f"\n📈 探索統計 ({stats.reason}): {stats.nodes}ノード (連続リーチ {stats.threat_nodes}ノード), "
+              f"{stats.elapsed:.3f}秒")
+        for depth, nodes, seconds, done in stats.iterations:
+            print(f"  深さ{depth:2d}: {nodes:8d}ノード {seconds:.3f}秒{'' if done else ' (打ち切り)'}")
+        print(f"  葉の評価 {stats.leaf_evaluations}回, βカット {stats.cutoffs}回 "
+              f"(最初の手で {stats.first_move_cutoff_rate() * 100:.1f}%), "
+              f"実効分岐数 {stats.effective_branching_factor():.2f}")
+        print(f"  読み直し: PVS {stats.pvs_researches}回, アスピレーション {stats.aspiration_researches}回")
+        if stats.playouts:
+            print(f"  🌲 プレイアウト {stats.playouts}回 ({stats.playouts / max(stats.elapsed, 1e-9):.0f}回/秒), "
+                  f"引き継いだ訪問 {stats.reused_visits}回")
+        if stats.tt_probes > 0:
+            hit_rate = stats.tt_hits / stats.tt_probes * 100
+            print(f"  💾 置換表: ヒット率 {hit_rate:.1f}% ({stats.tt_hits}/{stats.tt_probes}), "
+                  f"衝突 {stats.tt_collisions}回, 上書き {stats.tt_overwrites}回")
+        print(f"  読み筋: {' → '.join(str(move) for move in stats.pv)}")
 
-    def get_legal_moves(self, board: Board) -> List[Tuple[int, int, int]]:
-        """現在置けるすべての手を (x, y, z) で返す。満杯列は除外。"""
+    def get_legal_moves(self, pos: BitBoard) -> List[Tuple[int, int, int]]:
+        """現在置けるすべての手を (x, y, z) で返す。満杯列は除外。
+        
+        差分更新している列の高さから列番号 x + 4*y の順に作り、手のタプルは CELL_MOVES のものを使い回す。
+        """
         moves: List[Tuple[int, int, int]] = []
-        for y in range(4):
-            for x in range(4):
-                z = self.get_height(board, x, y)
-                if z < 4:
-                    moves.append((x, y, z))
+        column = 0
+        for z in pos.heights:
+            if z < 4:
+                moves.append(CELL_MOVES[column + 16 * z])
+            column += 1
         return moves
 
-    def print_legal_moves(self, board: Board) -> None:
+    def print_legal_moves(self, pos: BitBoard) -> None:
         """置けるマスを4x4の表で表示。各セルには石が落ちる z を表示（満杯は .）。"""
         grid = [['.' for _ in range(4)] for _ in range(4)]
-        moves = self.get_legal_moves(board)
+        moves = self.get_legal_moves(pos)
         for x, y, z in moves:
             grid[y][x] = str(z)
 
@@ -65,175 +904,106 @@ class MyAI(Alg3D):
             print(f"y={y} |", ' '.join(grid[y]))
         print("合法手一覧:", sorted(moves))
     
-    def count_accessible_lines(self, board: Board, x: int, y: int, z: int, player: int) -> int:
+    def count_accessible_lines(self, pos: BitBoard, x: int, y: int, z: int, player: int) -> int:
         """指定位置に石を置いた時にアクセスできる勝利ライン数をカウント"""
-        # 仮想的に石を置く
-        temp_board = [[[board[z][y][x] for x in range(4)] for y in range(4)] for z in range(4)]
-        temp_board[z][y][x] = player
+        index = x + 4 * y + 16 * z
+        own = pos.stones[player]
         
         accessible_lines = 0
         
-        # 13方向の直線をチェック
-        directions = [
-            (1, 0, 0),   # x軸方向
-            (0, 1, 0),   # y軸方向
-            (0, 0, 1),   # z軸方向
-            (1, 1, 0),   # xy対角線
-            (1, 0, 1),   # xz対角線
-            (0, 1, 1),   # yz対角線
-            (1, 1, 1),   # xyz対角線
-            (1, -1, 0),  # xy逆対角線
-            (1, 0, -1),  # xz逆対角線
-            (0, 1, -1),  # yz逆対角線
-            (1, -1, -1), # xyz逆対角線
-            (1, 1, -1),  # xy正、z負対角線
-            (1, -1, 1),  # xy負、z正対角線
-        ]
-        
-        for dx, dy, dz in directions:
-            count = 1  # 現在の石を含む
+        # このセルを通る勝利ラインのみをチェック
+        for line in CELL_LINES[index]:
+            cells = WIN_LINES[line]
+            k = cells.index(index)
             
-            # 正方向にカウント
-            nx, ny, nz = x + dx, y + dy, z + dz
-            while 0 <= nx < 4 and 0 <= ny < 4 and 0 <= nz < 4 and temp_board[nz][ny][nx] == player:
-                count += 1
-                nx, ny, nz = nx + dx, ny + dy, nz + dz
-            
-            # 負方向にカウント
-            nx, ny, nz = x - dx, y - dy, z - dz
-            while 0 <= nx < 4 and 0 <= ny < 4 and 0 <= nz < 4 and temp_board[nz][ny][nx] == player:
-                count += 1
-                nx, ny, nz = nx - dx, ny - dy, nz - dz
-            
-            # 4つ以上並ぶ可能性があるラインをカウント
-            if count >= 2:  # 2つ以上並んでいるライン
+            # 隣のセルに自分の石があれば、置いた石と合わせて2つ以上並ぶ
+            if (k > 0 and own >> cells[k - 1] & 1) or (k < 3 and own >> cells[k + 1] & 1):
                 accessible_lines += 1
         
         return accessible_lines
     
-    def classify_directions(self, board: Board, x: int, y: int, z: int, player: int) -> Tuple[List[Tuple[int, int, int]], List[Tuple[int, int, int]], List[Tuple[int, int, int]]]:
-        """指定位置に石を置いた時に、方向を3つに分類して返す"""
+    def classify_directions(self, pos: BitBoard, x: int, y: int, z: int, player: int) -> Tuple[List[int], List[int], List[int]]:
+        """指定位置に石を置いた時に、このセルを通る勝利ライン番号を3つに分類して返す"""
         my_accessible_directions = []  # 自分のアクセスライン（自分の石しかないか空）
         opponent_accessible_directions = []  # 相手のアクセスライン（相手の石しかない）
         mixed_directions = []  # 混在ライン（自分の石と相手の石が混在）
         
-        opponent = 3 - player
-        
-        # 13方向の直線をチェック
-        directions = [
-            (1, 0, 0),   # x軸方向
-            (0, 1, 0),   # y軸方向
-            (0, 0, 1),   # z軸方向
-            (1, 1, 0),   # xy対角線
-            (1, 0, 1),   # xz対角線
-            (0, 1, 1),   # yz対角線
-            (1, 1, 1),   # xyz対角線
-            (1, -1, 0),  # xy逆対角線
-            (1, 0, -1),  # xz逆対角線
-            (0, 1, -1),  # yz逆対角線
-            (1, -1, -1), # xyz逆対角線
-            (1, 1, -1),  # xy正、z負対角線
-            (1, -1, 1),  # xy負、z正対角線
-        ]
+        opp_counts = pos.line_counts[3 - player]
         
-        for dx, dy, dz in directions:
-            # 正方向の最大距離と障害物チェック
-            max_pos = 0
-            has_opponent_stone = False
-            for i in range(1, 4):
-                nx, ny, nz = x + i*dx, y + i*dy, z + i*dz
-                if 0 <= nx < 4 and 0 <= ny < 4 and 0 <= nz < 4:
-                    if board[nz][ny][nx] == opponent:
-                        has_opponent_stone = True
-                        break
-                    max_pos = i
-                else:
-                    break
-            
-            # 負方向の最大距離と障害物チェック
-            max_neg = 0
-            for i in range(1, 4):
-                nx, ny, nz = x - i*dx, y - i*dy, z - i*dz
-                if 0 <= nx < 4 and 0 <= ny < 4 and 0 <= nz < 4:
-                    if board[nz][ny][nx] == opponent:
-                        has_opponent_stone = True
-                        break
-                    max_neg = i
-                else:
-                    break
-            
-            # 合計で4つ以上並べるかチェック
-            if max_pos + max_neg + 1 >= 4:
-                # ライン上の石の種類をチェック
-                my_stones = 0
-                opponent_stones = 0
-                
-                for i in range(-max_neg, max_pos + 1):
-                    if i == 0:
-                        continue  # 自分の位置はスキップ
-                    nx, ny, nz = x + i*dx, y + i*dy, z + i*dz
-                    if 0 <= nx < 4 and 0 <= ny < 4 and 0 <= nz < 4:
-                        if board[nz][ny][nx] == player:
-                            my_stones += 1
-                        elif board[nz][ny][nx] == opponent:
-                            opponent_stones += 1
-                
-                # 分類
-                if my_stones > 0 and opponent_stones > 0:
-                    mixed_directions.append((dx, dy, dz))
-                elif my_stones > 0:
-                    my_accessible_directions.append((dx, dy, dz))
-                elif opponent_stones > 0:
-                    opponent_accessible_directions.append((dx, dy, dz))
-                else:
-                    my_accessible_directions.append((dx, dy, dz))  # 空のラインは自分のアクセスライン
+        for line in CELL_LINES[x + 4 * y + 16 * z]:
+            # 相手の石があるラインは遮断されて4つ並べられないため対象外
+            # （そのため相手ライン・混在ラインは常に空になる）
+            if opp_counts[line]:
+                continue
+            my_accessible_directions.append(line)  # 空のラインも自分のアクセスライン
         
         return my_accessible_directions, opponent_accessible_directions, mixed_directions
     
-    def get_accessible_directions(self, board: Board, x: int, y: int, z: int, player: int) -> List[Tuple[int, int, int]]:
-        """指定位置に石を置いた時に、アクセス可能な方向の配列を返す（後方互換性のため）"""
-        my_accessible, _, _ = self.classify_directions(board, x, y, z, player)
+    def get_accessible_directions(self, pos: BitBoard, x: int, y: int, z: int, player: int) -> List[int]:
+        """指定位置に石を置いた時に、アクセス可能なライン番号の配列を返す（後方互換性のため）"""
+        my_accessible, _, _ = self.classify_directions(pos, x, y, z, player)
         return my_accessible
     
-    def count_stones_in_directions(self, board: Board, x: int, y: int, z: int, directions: List[Tuple[int, int, int]], target_player: int) -> int:
-        """指定された方向リスト内で、対象プレイヤーの石の数をカウント"""
+    def count_stones_in_directions(self, pos: BitBoard, x: int, y: int, z: int, directions: List[int], target_player: int) -> int:
+        """指定されたライン番号リスト内で、対象プレイヤーの石の数をカウント"""
+        counts = pos.line_counts[target_player]
         stone_count = 0
         
-        for dx, dy, dz in directions:
-            # 正方向の最大距離を計算
-            max_pos = 0
-            for i in range(1, 4):
-                nx, ny, nz = x + i*dx, y + i*dy, z + i*dz
-                if 0 <= nx < 4 and 0 <= ny < 4 and 0 <= nz < 4:
-                    max_pos = i
-                else:
-                    break
-            
-            # 負方向の最大距離を計算
-            max_neg = 0
-            for i in range(1, 4):
-                nx, ny, nz = x - i*dx, y - i*dy, z - i*dz
-                if 0 <= nx < 4 and 0 <= ny < 4 and 0 <= nz < 4:
-                    max_neg = i
-                else:
-                    break
-            
-            # この方向の対象プレイヤーの石をカウント
-            for i in range(-max_neg, max_pos + 1):
-                if i == 0:
-                    continue  # 自分の位置はスキップ
-                nx, ny, nz = x + i*dx, y + i*dy, z + i*dz
-                if 0 <= nx < 4 and 0 <= ny < 4 and 0 <= nz < 4:
-                    if board[nz][ny][nx] == target_player:
-                        stone_count += 1
+        for line in directions:
+            stone_count += counts[line]
+        
+        # 自分の位置はスキップ
+        if pos.stones[target_player] >> (x + 4 * y + 16 * z) & 1:
+            stone_count -= len(directions)
         
         return stone_count
     
-    def count_potential_lines(self, board: Board, x: int, y: int, z: int, player: int) -> int:
+    def count_potential_lines(self, pos: BitBoard, x: int, y: int, z: int, player: int) -> int:
         """指定位置に石を置いた時に、4つ並ぶ可能性があるライン数をカウント"""
-        return len(self.get_accessible_directions(board, x, y, z, player))
+        return self.extract_features(pos, x, y, z, player)[0]
     
-    def print_line_accessibility(self, board: Board, player: int) -> None:
+    def extract_features(self, pos: BitBoard, x: int, y: int, z: int, player: int) -> Tuple[int, int, int, int, int, int, int, int]:
+        """指定位置に石を置いた時の評価の特徴量を、このセルを通るラインを1回ずつ見て求める
+        
+        (アクセス可能ライン数, アクセスライン上の自分の石数, 相手ライン上の相手の石数,
+         混在ライン上の自分の石数, 混在ライン上の相手の石数, ダブルリーチライン数,
+         相手のダブルリーチライン数, 偶奇が有利な浮いたリーチ数) を返す。
+        各値は classify_directions・count_stones_in_directions・count_double_reach_lines・
+        count_opponent_double_reach_lines を個別に呼んだ場合と同じ。相手の石があるラインは
+        アクセスラインから外すため、相手ライン・混在ラインの石数は常に0になる。
+        """
+        index = x + 4 * y + 16 * z
+        own_counts = pos.line_counts[player]
+        opponent_counts = pos.line_counts[3 - player]
+        own = pos.stones[player] | 1 << index
+        good_layers = EVEN_LAYER_MASK if player == 1 else ODD_LAYER_MASK
+        heights = pos.heights
+        lines = 0
+        own_stones = 0
+        double_reach_lines = 0
+        opponent_double_reach_lines = 0
+        parity_threats = 0
+        for line in CELL_LINES[index]:
+            own_count = own_counts[line]
+            opponent_count = opponent_counts[line]
+            if opponent_count == 0:
+                lines += 1
+                own_stones += own_count
+                if own_count:
+                    double_reach_lines += 1  # 置く石と合わせて自分の石が2個以上
+                    if own_count == 2:
+                        # 置くとリーチになる。残り1つの空きマスが浮いていて、偶奇が自分に有利な段なら数える
+                        cell = (LINE_MASKS[line] & ~own).bit_length() - 1
+                        column = cell % 16
+                        if cell // 16 > heights[column] + (column == index % 16) and good_layers >> cell & 1:
+                            parity_threats += 1
+            elif own_count == 0 and opponent_count >= 2:
+                opponent_double_reach_lines += 1  # 相手から見たアクセスラインで相手の石が2個以上
+        if pos.stones[player] >> index & 1:
+            own_stones -= lines  # 自分の位置はスキップ
+        return lines, own_stones, 0, 0, 0, double_reach_lines, opponent_double_reach_lines, parity_threats
+    
+    def print_line_accessibility(self, pos: BitBoard, player: int) -> None:
         """各マスに置いた時のアクセス可能ライン数を表示"""
         print(f"\n📊 プレイヤー{player}の各マスアクセス可能ライン数:")
         print("  x→   0 1 2 3    （値＝4つ並ぶ可能性があるライン数）")
@@ -241,16 +1011,16 @@ class MyAI(Alg3D):
         for y in range(3, -1, -1):
             print(f"y={y} |", end=" ")
             for x in range(4):
-                if self.can_place_stone(board, x, y):
-                    z = self.get_height(board, x, y)
+                if self.can_place_stone(pos, x, y):
+                    z = self.get_height(pos, x, y)
                     # 常に潜在的なライン数を表示
-                    lines = self.count_potential_lines(board, x, y, z, player)
+                    lines = self.extract_features(pos, x, y, z, player)[0]
                     print(f"{lines:2d}", end=" ")
                 else:
                     print(" .", end=" ")
             print()
     
-    def visualize_board(self, board: Board) -> None:
+    def visualize_board(self, pos: BitBoard) -> None:
         """3D盤面を可視化"""
         print("\n" + "=" * 50)
         print("立体四目並べ盤面 (Z軸: 下から上へ 0→3)")
@@ -262,43 +1032,51 @@ class MyAI(Alg3D):
             for y in range(4):
                 print(f"{y} ", end="")
                 for x in range(4):
-                    if board[z][y][x] == 0:
+                    value = pos.cell(x, y, z)
+                    if value == 0:
                         print("・", end=" ")
-                    elif board[z][y][x] == 1:
+                    elif value == 1:
                         print("●", end=" ")  # 先手（黒）
-                    elif board[z][y][x] == 2:
+                    elif value == 2:
                         print("○", end=" ")  # 後手（白）
                 print()
     
-    def print_move_reason(self, board: Board, player: int, move: Tuple[int, int]) -> None:
-        """AIの選択理由を表示"""
+    def print_move_reason(self, pos: BitBoard, player: int, move: Tuple[int, int]) -> None:
+        """AIの選択理由を表示（find_best_move が記録した理由を使い、再計算しない）"""
         print(f"\n🎮 AI選択: {move}")
         print(f"プレイヤー: {player} ({'先手(黒)' if player == 1 else '後手(白)'})")
         
-        # 選択理由を分析
-        win_move = self.find_winning_move(board, player)
-        if win_move and win_move == move:
+        if self._move_reason == "book":
+            print("📖 理由: 定跡")
+        elif self._move_reason == "forced":
+            print("➡️ 理由: 置ける列が1つだけ")
+        elif self._move_reason == "win":
             print("🏆 理由: 勝利手")
-            return
-        
-        opponent = 3 - player
-        block_move = self.find_winning_move(board, opponent)
-        if block_move and block_move == move:
+        elif self._move_reason == "block":
             print("🛡️ 理由: 防御手")
-            return
-        
-        best_line_move = self.find_highest_line_access_move(board, player)
-        if best_line_move and best_line_move == move:
-            score = self.evaluate_position(board, move[0], move[1], self.get_height(board, move[0], move[1]), player, 0)
-            print(f"🎯 理由: 最高重み点数 ({score}点)")
-            return
-        
-        print("📍 理由: フォールバック")
+        elif self._move_reason == "endgame":
+            result, distance = self._endgame_result
+            label = {1: "勝ち", 0: "引き分け", -1: "負け"}[result]
+            print(f"🧮 理由: 終盤完全読み（{label}, 決着まで{distance}手）")
+        elif self._move_reason == "threat":
+            print("⚔️ 理由: 連続リーチで勝ちを読み切った手")
+        elif self._move_reason == "mcts":
+            node = self._mcts_tree
+            print(f"🌲 理由: モンテカルロ木探索で訪問回数が最多 ({node.visits}回, "
+                  f"勝率換算 {(node.mean_value() + 1) * 50:.1f}%)")
+        elif self._move_reason == "search" and move in self._root_scores:
+            score = self._root_scores[move]
+            print(f"🎯 理由: 探索評価値が最高 ({score:.1f}点, 深さ{self._pv_depth})")
+        else:
+            print("📍 理由: フォールバック")
     
-    def print_position_scores(self, board: Board, player: int) -> None:
+    def print_position_scores(self, pos: BitBoard, player: int) -> None:
         """各マスの重み（点数）を詳細表示"""
         print(f"\n🎯 プレイヤー{player}の各マス重み詳細:")
         
+        # 置けるマスごとの特徴量を一度だけ求めて、各表で使い回す
+        features = {(x, y): self.extract_features(pos, x, y, z, player) for x, y, z in self.get_legal_moves(pos)}
+        
         # 各重みの詳細を表示
         print("\n📊 重み詳細:")
         print("  x→   0 1 2 3    （値＝各重みの点数）")
@@ -308,9 +1086,8 @@ class MyAI(Alg3D):
         for y in range(3, -1, -1):
             print(f"y={y} |", end=" ")
             for x in range(4):
-                if self.can_place_stone(board, x, y):
-                    z = self.get_height(board, x, y)
-                    lines = self.count_potential_lines(board, x, y, z, player)
+                if (x, y) in features:
+                    lines = features[(x, y)][0]
                     print(f"{lines*1:2d}", end=" ")
                 else:
                     print(" .", end=" ")
@@ -321,9 +1098,8 @@ class MyAI(Alg3D):
         for y in range(3, -1, -1):
             print(f"y={y} |", end=" ")
             for x in range(4):
-                if self.can_place_stone(board, x, y):
-                    z = self.get_height(board, x, y)
-                    own_stones = self.count_own_stones_in_lines(board, x, y, z, player)
+                if (x, y) in features:
+                    own_stones = features[(x, y)][1]
                     print(f"{own_stones*2:2d}", end=" ")
                 else:
                     print(" .", end=" ")
@@ -334,10 +1110,9 @@ class MyAI(Alg3D):
         for y in range(3, -1, -1):
             print(f"y={y} |", end=" ")
             for x in range(4):
-                if self.can_place_stone(board, x, y):
-                    z = self.get_height(board, x, y)
-                    own_stones = self.count_own_stones_in_lines(board, x, y, z, player)
-                    opponent_stones = self.count_opponent_stones_in_lines(board, x, y, z, player)
+                if (x, y) in features:
+                    own_stones = features[(x, y)][1]
+                    opponent_stones = features[(x, y)][2] + features[(x, y)][4]
                     if own_stones > 0 and opponent_stones > 0:
                         penalty = opponent_stones * 2
                         print(f"-{penalty:2d}", end=" ")
@@ -352,10 +1127,9 @@ class MyAI(Alg3D):
         for y in range(3, -1, -1):
             print(f"y={y} |", end=" ")
             for x in range(4):
-                if self.can_place_stone(board, x, y):
-                    z = self.get_height(board, x, y)
-                    own_stones = self.count_own_stones_in_lines(board, x, y, z, player)
-                    opponent_stones = self.count_opponent_stones_in_lines(board, x, y, z, player)
+                if (x, y) in features:
+                    own_stones = features[(x, y)][1]
+                    opponent_stones = features[(x, y)][2] + features[(x, y)][4]
                     if own_stones == 0 and opponent_stones > 0:
                         # 段階的加点の計算
                         bonus = 0
@@ -373,7 +1147,7 @@ class MyAI(Alg3D):
         for y in range(3, -1, -1):
             print(f"y={y} |", end=" ")
             for x in range(4):
-                if self.can_place_stone(board, x, y):
+                if self.can_place_stone(pos, x, y):
                     if (x == 0 or x == 3) and (y == 0 or y == 3):  # 角の4マス
                         print("  2", end=" ")
                     elif (x == 1 or x == 2) and (y == 1 or y == 2):  # 中央の4マス
@@ -389,9 +1163,8 @@ class MyAI(Alg3D):
         for y in range(3, -1, -1):
             print(f"y={y} |", end=" ")
             for x in range(4):
-                if self.can_place_stone(board, x, y):
-                    z = self.get_height(board, x, y)
-                    double_reach_lines = self.count_double_reach_lines(board, x, y, z, player)
+                if (x, y) in features:
+                    double_reach_lines = features[(x, y)][5]
                     if double_reach_lines >= 2:
                         bonus = (double_reach_lines - 1) * 100  # 2個目以降=100点
                         print(f"+{bonus:2d}", end=" ")
@@ -406,9 +1179,8 @@ class MyAI(Alg3D):
         for y in range(3, -1, -1):
             print(f"y={y} |", end=" ")
             for x in range(4):
-                if self.can_place_stone(board, x, y):
-                    z = self.get_height(board, x, y)
-                    opponent_double_reach_lines = self.count_opponent_double_reach_lines(board, x, y, z, player)
+                if (x, y) in features:
+                    opponent_double_reach_lines = features[(x, y)][6]
                     if opponent_double_reach_lines >= 2:
                         bonus = (opponent_double_reach_lines - 1) * 100  # 2個目以降=100点
                         print(f"+{bonus:2d}", end=" ")
@@ -419,329 +1191,951 @@ class MyAI(Alg3D):
             print()
         
         # 6. 罠回避（統合版・depth別重み）
-        print("\n6️⃣ 罠回避 (自分の手:勝利手100点減点,最大点数*0.5 / 相手の手:勝利手80点減点,最大点数*0.4):")
+        print("\n6️⃣ 罠回避 (相手の勝利手1個=100点減点):")
         for y in range(3, -1, -1):
             print(f"y={y} |", end=" ")
             for x in range(4):
-                if self.can_place_stone(board, x, y):
-                    z = self.get_height(board, x, y)
-                    opponent_winning_moves = self.check_opponent_winning_moves_after_my_move(board, x, y, z, player)
-                    opponent_max_score = self.get_opponent_max_score_after_my_move(board, x, y, z, player)
-                    
+                if self.can_place_stone(pos, x, y):
+                    z = self.get_height(pos, x, y)
+                    opponent_winning_moves = self.check_opponent_winning_moves_after_my_move(pos, x, y, z, player)
                     if opponent_winning_moves > 0:
-                        penalty = opponent_winning_moves * 100  # 自分の手の重みで表示
-                        print(f"-{penalty:2d}", end=" ")
+                        print(f"-{opponent_winning_moves * 100:2d}", end=" ")
                     else:
-                        penalty = int(opponent_max_score * 0.5)  # 自分の手の重みで表示
-                        if penalty > 0:
-                            print(f"-{penalty:2d}", end=" ")
-                        else:
-                            print("  0", end=" ")
+                        print("  0", end=" ")
                 else:
                     print(" .", end=" ")
             print()
         
-        # 7. 合計
-        print("\n🎯 合計点数:")
+        # 7. 探索評価値（探索で計算済みの値を表示。最善手以外はαβ枝刈りによる上限値）
+        print(f"\n🎯 探索評価値 (深さ{self._pv_depth}, 最善手以外は上限値):")
         for y in range(3, -1, -1):
             print(f"y={y} |", end=" ")
             for x in range(4):
-                if self.can_place_stone(board, x, y):
-                    z = self.get_height(board, x, y)
-                    score = self.evaluate_position(board, x, y, z, player, 0)
-                    print(f"{int(score):2d}", end=" ")
+                if (x, y) in self._root_scores:
+                    print(f"{int(self._root_scores[(x, y)]):2d}", end=" ")
                 else:
                     print(" .", end=" ")
             print()
     
-    def find_best_move(self, board: Board, player: int):
-        """最適な手を見つける"""
+    def probe_book(self, pos: BitBoard, player: int):
+        """定跡に登録された局面なら、その手を実際の盤面の向きに直して返す（なければ None）"""
+        key, symmetry = pos.canonical_key(player)
+        column = OPENING_BOOK.get(key)
+        if column is None:
+            return None
+        x, y = SYMMETRY_MOVES[INVERSE_SYMMETRY[symmetry]][column]
+        if not self.can_place_stone(pos, x, y):
+            return None
+        return (x, y)
+    
+    def find_best_move(self, pos: BitBoard, player: int):
+        """最適な手を見つける（選んだ理由を _move_reason に記録）"""
+        self._root_scores = {}
+        
+        # 0. 置ける列が1つしかなければ考えるまでもない
+        moves = self.get_legal_moves(pos)
+        if len(moves) == 1:
+            self._move_reason = "forced"
+            return moves[0][:2]
+        
         # 1. 勝利できる手があるかチェック
-        win_move = self.find_winning_move(board, player)
+        win_move = self.find_winning_move(pos, player)
         if win_move:
+            self._move_reason = "win"
             return win_move
         
         # 2. 相手の勝利を阻止する手があるかチェック
         opponent = 3 - player  # 相手のプレイヤー番号
-        block_move = self.find_winning_move(board, opponent)
+        block_move = self.find_winning_move(pos, opponent)
         if block_move:
+            self._move_reason = "block"
             return block_move
         
-        # 3. 最もアクセス可能なライン数が多い位置を探す
-        best_move = self.find_highest_line_access_move(board, player)
-        if best_move:
-            return best_move
-        
-        # 4. 空いている最初の位置に置く
-        return self.find_first_available_move(board)
+        # 3. 空きマスが少なければ勝敗を完全に読み切る
+        if sum(4 - height for height in pos.heights) < ENDGAME_EMPTY_THRESHOLD:
+            solved = self.solve_endgame(pos, player)
+            if solved:
+                self._move_reason = "endgame"
+                self._endgame_result = solved[1:]
+                return solved[0]
+        
+        # 4. 連続リーチ（相手が必ず受けなければならない手の連続）で勝ちを読み切る
+        threat_move = self.find_threat_win(pos, player)
+        if threat_move:
+            self._move_reason = "threat"
+            return threat_move
+        
+        # 5. 反復深化αβ探索（search_mode="mcts" ならモンテカルロ木探索）で最も評価の高い手を探す
+        if self.search_mode == "mcts":
+            best_move = self.mcts_search(pos, player)
+            if best_move:
+                self._move_reason = "mcts"
+                return best_move
+        else:
+            best_move, _ = self.iterative_deepening(pos, player)
+            if best_move:
+                self._move_reason = "search"
+                return best_move
+        
+        # 6. 空いている最初の位置に置く
+        self._move_reason = "fallback"
+        return self.find_first_available_move(pos)
     
-    def count_opponent_stones_in_lines(self, board: Board, x: int, y: int, z: int, player: int) -> int:
-        """指定位置に石を置いた時に、アクセスできるライン上の相手の石の数をカウント"""
+    def reuse_mcts_tree(self, pos: BitBoard, player: int, last_move: Tuple[int, int, int]) -> None:
+        """前回のモンテカルロ木探索の木から、相手の直前の手の部分木を今回のルートとして取り出す"""
+        node, expected_hash = self._mcts_tree, self._mcts_hash
+        self._mcts_tree, self._mcts_hash, self._mcts_root = None, None, None
+        if node is None or not node.children or last_move is None or last_move[0] is None:
+            return
+        # 相手の直前の手を取り除いた盤面が、前回自分が打った直後の盤面と一致するか
+        # （盤面は変更せず、列の一番上の相手の石の Zobrist 値をハッシュから外して比べる）
+        x, y = last_move[0], last_move[1]
+        if not (0 <= x < 4 and 0 <= y < 4) or pos.heights[x + 4 * y] == 0:
+            return
         opponent = 3 - player
-        opponent_stones = 0
-        accessible_directions = self.get_accessible_directions(board, x, y, z, player)
-        
-        for dx, dy, dz in accessible_directions:
-            # 正方向の最大距離と障害物チェック
-            max_pos = 0
-            for i in range(1, 4):
-                nx, ny, nz = x + i*dx, y + i*dy, z + i*dz
-                if 0 <= nx < 4 and 0 <= ny < 4 and 0 <= nz < 4:
-                    # 他のプレイヤーの石がある場合はラインを断ち切る
-                    if board[nz][ny][nx] != 0 and board[nz][ny][nx] != player:
-                        break
-                    max_pos = i
-                else:
-                    break
-            
-            # 負方向の最大距離と障害物チェック
-            max_neg = 0
-            for i in range(1, 4):
-                nx, ny, nz = x - i*dx, y - i*dy, z - i*dz
-                if 0 <= nx < 4 and 0 <= ny < 4 and 0 <= nz < 4:
-                    # 他のプレイヤーの石がある場合はラインを断ち切る
-                    if board[nz][ny][nx] != 0 and board[nz][ny][nx] != player:
-                        break
-                    max_neg = i
-                else:
-                    break
-            
-                # このライン上で相手の石をカウント
-                for i in range(-max_neg, max_pos + 1):
-                    if i == 0:
-                        continue  # 自分の位置はスキップ
-                    nx, ny, nz = x + i*dx, y + i*dy, z + i*dz
-                    if 0 <= nx < 4 and 0 <= ny < 4 and 0 <= nz < 4:
-                        if board[nz][ny][nx] == opponent:
-                            opponent_stones += 1
-        
-        return opponent_stones
-    
-    def count_own_stones_in_lines(self, board: Board, x: int, y: int, z: int, player: int) -> int:
-        """指定位置に石を置いた時に、アクセスできるライン上の自分の石の数をカウント"""
-        own_stones = 0
-        accessible_directions = self.get_accessible_directions(board, x, y, z, player)
-        
-        for dx, dy, dz in accessible_directions:
-            # 正方向の最大距離と障害物チェック
-            max_pos = 0
-            for i in range(1, 4):
-                nx, ny, nz = x + i*dx, y + i*dy, z + i*dz
-                if 0 <= nx < 4 and 0 <= ny < 4 and 0 <= nz < 4:
-                    # 他のプレイヤーの石がある場合はラインを断ち切る
-                    if board[nz][ny][nx] != 0 and board[nz][ny][nx] != player:
-                        break
-                    max_pos = i
-                else:
-                    break
-            
-            # 負方向の最大距離と障害物チェック
-            max_neg = 0
-            for i in range(1, 4):
-                nx, ny, nz = x - i*dx, y - i*dy, z - i*dz
-                if 0 <= nx < 4 and 0 <= ny < 4 and 0 <= nz < 4:
-                    # 他のプレイヤーの石がある場合はラインを断ち切る
-                    if board[nz][ny][nx] != 0 and board[nz][ny][nx] != player:
+        index = x + 4 * y + 16 * (pos.heights[x + 4 * y] - 1)
+        if not pos.stones[opponent] >> index & 1:
+            return
+        if pos.hashes[0] ^ SYMMETRY_ZOBRIST[opponent][index][0] == expected_hash:
+            self._mcts_root = next((child for child in node.children if child.move == (x, y)), None)
+    
+    def mcts_search(self, pos: BitBoard, player: int) -> Tuple[int, int]:
+        """モンテカルロ木探索で最も訪問回数の多い手を返す
+        
+        PUCT で木を降り、展開した節点の子に静的評価点のソフトマックスを事前確率として与え、
+        そこから戦術的なプレイアウトで決着まで打って結果を根まで戻す。目安の時間を過ぎたら、
+        訪問回数が最多の手と平均の結果が最良の手が一致した時点（遅くとも上限の時間）で終える。
+        選んだ手の節点は次の手番で相手の応手の部分木を再利用するために残す。
+        """
+        root = self._mcts_root
+        if root is None:
+            root = MCTSNode(None, 3 - player, 1.0)
+        self.stats.reused_visits = root.visits
+        if root.children is None:
+            self.expand_mcts_node(root, pos, player)
+        if not root.children:
+            return None
+        
+        search_pos = pos.copy()
+        clock = self._clock
+        while True:
+            now = time.process_time()
+            if now >= clock.hard_deadline or (now >= clock.soft_deadline and self.mcts_is_stable(root)):
+                break
+            self.mcts_simulate(root, search_pos, player)
+        
+        best = root.most_visited_child()
+        self._mcts_tree = best
+        pos.place(best.move[0], best.move[1], player)
+        self._mcts_hash = pos.hashes[0]
+        pos.remove(best.move[0], best.move[1])
+        # 読み筋: 訪問回数が最多の子を順にたどる
+        node = root
+        self.stats.pv = []
+        while node.children:
+            node = node.most_visited_child()
+            if node.visits == 0:
+                break
+            self.stats.pv.append(node.move)
+        return best.move
+    
+    def mcts_is_stable(self, root: MCTSNode) -> bool:
+        """訪問回数が最多の手が、平均の結果も最良か"""
+        best = root.most_visited_child()
+        return all(child.mean_value() <= best.mean_value() for child in root.children if child.visits)
+    
+    def mcts_simulate(self, root: MCTSNode, pos: BitBoard, player: int) -> None:
+        """木を1回降りて葉を展開し、プレイアウトの結果を通った節点に加える（盤面は元に戻す）"""
+        node = root
+        path = [root]
+        side = player
+        while node.children and node.terminal is None:
+            node = node.select_child()
+            pos.place(node.move[0], node.move[1], side)
+            path.append(node)
+            side = 3 - side
+        
+        if node.terminal is not None:
+            winner = node.mover
+        elif node.children is None:
+            self.expand_mcts_node(node, pos, side)
+            winner = self.mcts_playout(pos, side) if node.children else 0
+        else:
+            winner = 0  # 盤面が満杯（引き分け）
+        
+        for node in reversed(path[1:]):
+            pos.remove(node.move[0], node.move[1])
+        for node in path:
+            node.visits += 1
+            if winner:
+                node.value += 1.0 if winner == node.mover else -1.0
+        self._nodes += len(path)
+        self.stats.playouts += 1
+    
+    def expand_mcts_node(self, node: MCTSNode, pos: BitBoard, player: int) -> None:
+        """手番 player の節点に子を作る
+        
+        即勝ちがあればその手だけ、受けなければならない相手の勝ちマスが1つならその手だけを子にする
+        （プレイアウトと同じ戦術を木の中でも守る）。それ以外は全合法手に、静的評価点の
+        ソフトマックスを事前確率として与える。
+        """
+        moves = self.get_legal_moves(pos)
+        if not moves:
+            node.children = []
+            return
+        win_move = self.find_winning_move(pos, player)
+        if win_move:
+            node.children = [MCTSNode(win_move, player, 1.0, 1)]
+            return
+        threat_cells = self.find_opponent_threat_cells(pos, player)
+        blocks = [(x, y) for x, y, z in moves if threat_cells >> (x + 4 * y + 16 * z) & 1]
+        if len(blocks) == 1:
+            node.children = [MCTSNode(blocks[0], player, 1.0)]
+            return
+        
+        scored_moves = self.score_moves(pos, player, moves, threat_cells)
+        top = scored_moves[0][0]
+        weights = [math.exp((s - top) / MCTS_PRIOR_TEMPERATURE) for s, _, _, _ in scored_moves]
+        total = sum(weights)
+        node.children = [
+            MCTSNode((x, y), player, weight / total)
+            for weight, (_, x, y, _) in zip(weights, scored_moves)
+        ]
+    
+    def mcts_playout(self, pos: BitBoard, player: int) -> int:
+        """手番 player から決着まで打ち、勝者（引き分けは0）を返す（盤面は変更しない）
+        
+        石と勝ちマスはビットマスクだけで持つ。即勝ちがあれば勝ち、相手の勝ちマスが今すぐ置ければ受け
+        （2つ以上なら負け）、それ以外は真上に相手の勝ちマスがない手から一様に選ぶ。
+        石を置いても相手の勝ちマスはそのマスが埋まるだけなので、打った側の勝ちマスだけを計算し直す。
+        """
+        stones = [0, pos.stones[1], pos.stones[2]]
+        occupied = stones[1] | stones[2]
+        playable = pos.playable
+        empty = FULL_MASK ^ occupied
+        threats = [0, threat_mask(stones[1], empty), threat_mask(stones[2], empty)]
+        while True:
+            if not playable:
+                return 0
+            if threats[player] & playable:
+                return player
+            opponent = 3 - player
+            forced = threats[opponent] & playable
+            if forced:
+                if forced & (forced - 1):
+                    return opponent  # 受けきれない
+                bit = forced
+            else:
+                bit = random_bit(playable & ~(threats[opponent] >> 16) or playable)
+            stones[player] |= bit
+            occupied |= bit
+            playable ^= bit | bit << 16 & FULL_MASK
+            threats[opponent] &= ~bit
+            threats[player] = threat_mask(stones[player], FULL_MASK ^ occupied)
+            player = opponent
+    
+    def solve_endgame(self, pos: BitBoard, player: int):
+        """終盤の完全読みで (最善手, 結果, 決着までの手数) を返す
+        
+        結果は 1=勝ち / 0=引き分け / -1=負け。最短の勝ち、負けなら最も長く粘る手を選ぶ。
+        残り時間の一部で読み切れないか、置ける手がなければ None を返す（通常の探索に任せる）。
+        """
+        full_deadline = self._deadline
+        now = time.process_time()
+        self._deadline = now + (full_deadline - now) * ENDGAME_TIME_SHARE
+        self._endgame_tt.new_generation()
+        try:
+            best_move, score = self._solve_root(pos.copy(), player)
+        except SearchTimeout:
+            return None
+        finally:
+            self._deadline = full_deadline
+            self.stats.add_table(self._endgame_tt)
+        
+        if best_move is None:
+            return None  # 盤面が満杯
+        if score > 0:
+            return best_move, 1, ENDGAME_WIN - score
+        if score < 0:
+            return best_move, -1, ENDGAME_WIN + score
+        return best_move, 0, sum(4 - height for height in pos.heights)
+    
+    def _solve_root(self, pos: BitBoard, player: int) -> Tuple[Tuple[int, int], int]:
+        """終盤ソルバーのルート: 最善手と評価値（勝ちは ENDGAME_WIN - 決着までの手数）を返す"""
+        best_move = None
+        best_score = -ENDGAME_WIN
+        alpha, beta = -ENDGAME_WIN, ENDGAME_WIN
+        for x, y in self._endgame_moves(pos, player, None):
+            pos.place(x, y, player)
+            score = -self._solve(pos, 3 - player, -beta, -alpha, 1)
+            pos.remove(x, y)
+            if best_move is None or score > best_score:
+                best_move, best_score = (x, y), score
+                alpha = max(alpha, score)
+        return best_move, best_score
+    
+    def _solve(self, pos: BitBoard, player: int, alpha: int, beta: int, ply: int) -> int:
+        """終盤ソルバーの本体（ルートからの手数 ply を使って最短勝ちを優先するネガマックス）"""
+        self._nodes += 1
+        if self._nodes % TIME_CHECK_INTERVAL == 0 and time.process_time() > self._deadline:
+            raise SearchTimeout()
+        
+        playable = self.playable_cells(pos)
+        if self.threat_cells(pos, player) & playable:
+            return ENDGAME_WIN - (ply + 1)  # 次の手で勝ち
+        if not playable:
+            return 0  # 満杯: 引き分け
+        
+        # 勝ち負けまでの手数から評価値の範囲を絞る（次の手で勝てないので最短でも ply+3 手目）
+        beta = min(beta, ENDGAME_WIN - (ply + 3))
+        alpha = max(alpha, -(ENDGAME_WIN - (ply + 2)))
+        if alpha >= beta:
+            return alpha
+        
+        # 置換表には局面からの手数で保存しているので、ルートからの手数に直して使う
+        key, symmetry = pos.canonical_key(player)
+        entry = self._endgame_tt.probe(key)
+        tt_move = None
+        if entry is not None:
+            _, _, flag, stored, tt_move, _ = entry
+            tt_move = transform_move(tt_move, INVERSE_SYMMETRY[symmetry])
+            score = stored - ply if stored > 0 else stored + ply if stored < 0 else 0
+            if flag == TT_EXACT:
+                return score
+            if flag == TT_LOWER and score > alpha:
+                alpha = score
+            elif flag == TT_UPPER and score < beta:
+                beta = score
+            if alpha >= beta:
+                return score
+        
+        original_alpha = alpha
+        best_score = -ENDGAME_WIN
+        best_move = None
+        moves = self._endgame_moves(pos, player, tt_move)
+        for x, y in moves:
+            pos.place(x, y, player)
+            score = -self._solve(pos, 3 - player, -beta, -alpha, ply + 1)
+            pos.remove(x, y)
+            if score > best_score:
+                best_score, best_move = score, (x, y)
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        self.count_cutoff((x, y) == moves[0])
                         break
-                    max_neg = i
-                else:
-                    break
+        
+        if best_score <= original_alpha:
+            flag = TT_UPPER
+        elif best_score >= beta:
+            flag = TT_LOWER
+        else:
+            flag = TT_EXACT
+        stored = best_score + ply if best_score > 0 else best_score - ply if best_score < 0 else 0
+        self._endgame_tt.store(key, 64, flag, stored, transform_move(best_move, symmetry))
+        return best_score
+    
+    def _endgame_moves(self, pos: BitBoard, player: int, tt_move: Tuple[int, int]) -> List[Tuple[int, int]]:
+        """終盤ソルバーの手の順序: 置換表の手 → リーチを作る手 → その他 → 相手のリーチの真下"""
+        opponent = 3 - player
+        playable = self.playable_cells(pos)
+        opponent_threats = self.threat_cells(pos, opponent)
+        
+        # 相手の勝ちマスがあればそこを受けるしかない
+        forced = opponent_threats & playable
+        if forced:
+            index = forced.bit_length() - 1
+            return [(index % 4, index // 4 % 4)]
+        
+        own_counts = pos.line_counts[player]
+        opponent_counts = pos.line_counts[opponent]
+        ordered = []
+        for column, z in enumerate(pos.heights):
+            if z >= 4:
+                continue
+            index = column + 16 * z
+            move = (column % 4, column // 4)
+            if move == tt_move:
+                priority = 3
+            elif z < 3 and opponent_threats >> (index + 16) & 1:
+                priority = -1  # 置くと真上で相手が勝つ
+            elif any(own_counts[line] == 2 and opponent_counts[line] == 0 for line in CELL_LINES[index]):
+                priority = 1  # リーチを作る
+            else:
+                priority = 0
+            ordered.append((priority, move))
+        ordered.sort(key=lambda item: -item[0])
+        return [move for _, move in ordered]
+    
+    def find_threat_win(self, pos: BitBoard, player: int, node_budget: int = THREAT_NODE_BUDGET):
+        """連続リーチだけを読んで勝ちが確定する最初の手を返す（見つからなければ None）
+        
+        リーチ（置けば4つ揃う空きマス）を今すぐ置ける位置に作る手だけを候補とし、
+        相手は必ずそのマスを受ける。重力により、相手が受けた石の上に自分の
+        リーチが現れる場合も次の手で勝ちとして扱う。ノード数が上限に達したら
+        打ち切って None を返す。
+        """
+        self._threat_nodes = 0
+        move = self._threat_search(pos, player, THREAT_MAX_DEPTH, node_budget)
+        self.stats.threat_nodes += self._threat_nodes
+        return move
+    
+    def _threat_search(self, pos: BitBoard, attacker: int, depth: int, node_budget: int):
+        """攻め側の手番で連続リーチによる勝ちを探し、最初の手 (x, y) を返す"""
+        self._threat_nodes += 1
+        if self._threat_nodes > node_budget or depth <= 0:
+            return None
+        
+        defender = 3 - attacker
+        playable = self.playable_cells(pos)
+        attacker_threats = self.threat_cells(pos, attacker)
+        defender_threats = self.threat_cells(pos, defender)
+        
+        # 今すぐ勝てるマスがあれば勝ち
+        wins = attacker_threats & playable
+        if wins:
+            index = (wins & -wins).bit_length() - 1
+            return (index % 4, index // 4 % 4)
+        
+        # 相手に勝ちマスが2つ以上あれば受けきれない
+        defender_wins = defender_threats & playable
+        if popcount(defender_wins) >= 2:
+            return None
+        # 相手に勝ちマスがあればそこを受けるしかない（受けた手もリーチである必要がある）
+        candidates = defender_wins or playable
+        
+        attacker_counts = pos.line_counts[attacker]
+        defender_counts = pos.line_counts[defender]
+        while candidates:
+            bit = candidates & -candidates
+            candidates ^= bit
+            index = bit.bit_length() - 1
+            x, y = index % 4, index // 4 % 4
             
-            # このライン上で自分の石をカウント
-            for i in range(-max_neg, max_pos + 1):
-                if i == 0:
-                    continue  # 自分の位置はスキップ
-                nx, ny, nz = x + i*dx, y + i*dy, z + i*dz
-                if 0 <= nx < 4 and 0 <= ny < 4 and 0 <= nz < 4:
-                    if board[nz][ny][nx] == player:
-                        own_stones += 1
-        
-        return own_stones
-    
-    def count_double_reach_lines(self, board: Board, x: int, y: int, z: int, player: int) -> int:
-        """指定位置に石を置いた時に、自分の石が2個以上あるアクセスライン数をカウント"""
-        double_reach_lines = 0
-        accessible_directions = self.get_accessible_directions(board, x, y, z, player)
-        
-        for dx, dy, dz in accessible_directions:
-            # 正方向の最大距離と障害物チェック
-            max_pos = 0
-            for i in range(1, 4):
-                nx, ny, nz = x + i*dx, y + i*dy, z + i*dz
-                if 0 <= nx < 4 and 0 <= ny < 4 and 0 <= nz < 4:
-                    # 他のプレイヤーの石がある場合はラインを断ち切る
-                    if board[nz][ny][nx] != 0 and board[nz][ny][nx] != player:
-                        break
-                    max_pos = i
-                else:
-                    break
+            pos.place(x, y, attacker)
+            # この手で新しくできたリーチ（このマスを通るラインだけ調べればよい）
+            threats = attacker_threats & ~bit
+            for line in CELL_LINES[index]:
+                if attacker_counts[line] == 3 and defender_counts[line] == 0:
+                    threats |= LINE_MASKS[line] & ~pos.stones[attacker]
+            next_playable = (playable ^ bit) | ((bit << 16) & FULL_MASK)
+            forcing = threats & next_playable
             
-            # 負方向の最大距離と障害物チェック
-            max_neg = 0
-            for i in range(1, 4):
-                nx, ny, nz = x - i*dx, y - i*dy, z - i*dz
-                if 0 <= nx < 4 and 0 <= ny < 4 and 0 <= nz < 4:
-                    # 他のプレイヤーの石がある場合はラインを断ち切る
-                    if board[nz][ny][nx] != 0 and board[nz][ny][nx] != player:
-                        break
-                    max_neg = i
-                else:
-                    break
+            # リーチにならない手、または相手に即勝ちを許す手は候補外
+            if not forcing or defender_threats & ~bit & next_playable:
+                pos.remove(x, y)
+                continue
             
-            # このライン上で自分の石をカウント（自分を置く位置も含む）
-            own_count = 1  # 自分を置く位置
-            for i in range(-max_neg, max_pos + 1):
-                if i == 0:
-                    continue  # 自分の位置は既にカウント済み
-                nx, ny, nz = x + i*dx, y + i*dy, z + i*dz
-                if 0 <= nx < 4 and 0 <= ny < 4 and 0 <= nz < 4:
-                    if board[nz][ny][nx] == player:
-                        own_count += 1
+            if popcount(forcing) >= 2:
+                pos.remove(x, y)
+                return (x, y)  # 2か所同時のリーチは受けきれない
             
-            # 自分の石が2個以上あるラインをカウント
-            if own_count >= 2:
-                double_reach_lines += 1
+            # 相手はリーチのマスを受けるしかない
+            block = forcing.bit_length() - 1
+            pos.place(block % 4, block // 4 % 4, defender)
+            result = self._threat_search(pos, attacker, depth - 1, node_budget)
+            pos.remove(block % 4, block // 4 % 4)
+            pos.remove(x, y)
+            if result:
+                return (x, y)
         
-        return double_reach_lines
+        return None
     
-    def count_opponent_double_reach_lines(self, board: Board, x: int, y: int, z: int, player: int) -> int:
-        """指定位置に石を置いた時に、相手の石が2個以上あるアクセスライン数をカウント"""
-        opponent = 3 - player
-        opponent_double_reach_lines = 0
-        
-        # 相手の視点でアクセス可能な方向を取得
-        accessible_directions = self.get_accessible_directions(board, x, y, z, opponent)
-        
-        for dx, dy, dz in accessible_directions:
-            # 正方向の最大距離と障害物チェック
-            max_pos = 0
-            for i in range(1, 4):
-                nx, ny, nz = x + i*dx, y + i*dy, z + i*dz
-                if 0 <= nx < 4 and 0 <= ny < 4 and 0 <= nz < 4:
-                    # 自分の石がある場合はラインを断ち切る
-                    if board[nz][ny][nx] != 0 and board[nz][ny][nx] != opponent:
-                        break
-                    max_pos = i
+    def threat_cells(self, pos: BitBoard, player: int) -> int:
+        """置けば player の4つが揃う空きマスのビットマスクを返す"""
+        stones = pos.stones
+        return threat_mask(stones[player], FULL_MASK ^ stones[1] ^ stones[2])
+    
+    def analyze_threats(self, pos: BitBoard) -> List[List[Tuple[int, int, str]]]:
+        """両プレイヤーのリーチ（置けば4つ揃う空きマス）を列・高さ順に分類して返す
+        
+        戻り値は [未使用, 先手のリーチ, 後手のリーチ] で、各要素は (列, z, 種類) のリスト。
+        種類は "live"（今すぐ置ける）、"good"（下が空いていて、偶奇が持ち主に有利）、
+        "bad"（下が空いていて、偶奇が持ち主に不利）。
+        全64マスは偶数なので、相手と同じ列に打ち返し続ける（追従策）と先手は z が偶数、
+        後手は z が奇数の段を取ることになる。浮いたリーチは持ち主の取る段にあれば最後まで
+        生き残りやすく、列が埋まっていくと相手はその真下に打たざるを得なくなる。
+        """
+        playable = self.playable_cells(pos)
+        result = [None, [], []]
+        for owner in (1, 2):
+            threats = self.threat_cells(pos, owner)
+            good_layers = EVEN_LAYER_MASK if owner == 1 else ODD_LAYER_MASK
+            for index in range(64):
+                bit = 1 << index
+                if not threats & bit:
+                    continue
+                if playable & bit:
+                    kind = "live"
+                elif good_layers & bit:
+                    kind = "good"
                 else:
-                    break
+                    kind = "bad"
+                result[owner].append((index % 16, index // 16, kind))
+            result[owner].sort()
+        return result
+    
+    def is_zugzwang_loss(self, pos: BitBoard, player: int) -> bool:
+        """相手の追従策で手番 player の負けが確定しているかを返す
+        
+        全列の高さが偶数なら、相手は player が打った列に打ち返し続けることで z が奇数の
+        空きマスをすべて取れ、player は z が偶数の空きマスしか取れない。相手の石と奇数段の
+        空きマスだけでできたラインがあり、player の石と偶数段の空きマスだけでできた
+        ラインがなければ、player は揃えられないまま最後に相手が揃える。
+        """
+        for height in pos.heights:
+            if height & 1:
+                return False
+        own = pos.stones[player]
+        other = pos.stones[3 - player]
+        empty = FULL_MASK ^ own ^ other
+        opponent_wins = False
+        for mask in LINE_MASKS:
+            if not mask & other:
+                if not mask & empty & ODD_LAYER_MASK:
+                    return False  # player も偶数段だけで揃えられる
+            elif not mask & own and not mask & empty & EVEN_LAYER_MASK:
+                opponent_wins = True
+        return opponent_wins
+    
+    def playable_cells(self, pos: BitBoard) -> int:
+        """今すぐ石を置けるマス（各列の次に石が落ちるマス）のビットマスクを返す"""
+        return pos.playable
+    
+    def reuse_previous_search(self, pos: BitBoard, player: int, last_move: Tuple[int, int, int]) -> None:
+        """前回の読み筋どおりに相手が応じたかを確認し、探索の開始深さと手の候補を準備する"""
+        self._start_depth = 1
+        self._root_hint = None
+        pv, pv_depth, expected_hash = self._pv, self._pv_depth, self._expected_hash
+        self._pv, self._pv_depth, self._expected_hash = [], 0, None
+        
+        if len(pv) < 3 or last_move is None or last_move[0] is None:
+            return
+        # 相手の直前の手が予想した応手で、盤面も一致しているか
+        if (last_move[0], last_move[1]) != pv[1] or pos.hashes[0] != expected_hash:
+            return
+        
+        # 読み筋の続きを置換表に最善手のヒントとして入れ直す（古い世代で消えていても使えるように）
+        side = player
+        placed = []
+        for x, y in pv[2:]:
+            if not self.can_place_stone(pos, x, y):
+                break
+            key, symmetry = pos.canonical_key(side)
+            if self._tt.probe(key) is None:
+                # 深さ-1: 手の順序付けにだけ使う
+                self._tt.store(key, -1, TT_EXACT, 0.0, transform_move((x, y), symmetry))
+            pos.place(x, y, side)
+            placed.append((x, y))
+            side = 3 - side
+        for x, y in reversed(placed):
+            pos.remove(x, y)
+        
+        # 2手進んだ分だけ浅い深さは置換表で済むので、そこから始める
+        self._start_depth = max(1, pv_depth - 2)
+        self._root_hint = pv[2]
+    
+    def extract_pv(self, pos: BitBoard, player: int, max_length: int) -> List[Tuple[int, int]]:
+        """置換表の最善手をたどって読み筋を取り出す"""
+        pv = []
+        side = player
+        while len(pv) < max_length:
+            key, symmetry = pos.canonical_key(side)
+            entry = self._tt.probe(key)
+            if entry is None or entry[4] is None:
+                break
+            x, y = transform_move(entry[4], INVERSE_SYMMETRY[symmetry])
+            if not self.can_place_stone(pos, x, y):
+                break
+            pos.place(x, y, side)
+            pv.append((x, y))
+            side = 3 - side
+        for x, y in reversed(pv):
+            pos.remove(x, y)
+        return pv
+    
+    def iterative_deepening(self, pos: BitBoard, player: int) -> Tuple[Tuple[int, int], float]:
+        """締め切りまで深さを1ずつ増やして探索し、最後に完了した深さの最善手を返す"""
+        scored_moves = self.score_moves(pos, player)
+        if not scored_moves:
+            return None, 0.0
+        
+        # 深さ1も終わらない場合に備えて静的評価の最善手を保持しておく
+        best_score, x, y, _ = scored_moves[0]
+        best_move = self._root_hint or (x, y)
+        empty_cells = sum(4 - height for height in pos.heights)
+        completed_depth = 0
+        scores = []  # 完了した各深さの評価値
+        # キラー手は局面ごとに作り直し、ヒストリーは半減させて今の局面の実績を優先する
+        self._killers = [[None, None] for _ in range(MAX_PLY)]
+        self._history = [None] + [[value // 2 for value in history] for history in self._history[1:]]
+        # 打ち切られた探索は石を置いたまま抜けるため、複製した盤面で探索する
+        search_pos = pos.copy()
+        
+        for depth in range(min(self._start_depth, empty_cells), empty_cells + 1):
+            iteration_start = time.process_time()
+            iteration_nodes = self._nodes
+            # 評価値は深さの偶奇で揺れるので、同じ偶奇の深さの評価値を窓の中心にする
+            center = scores[-2] if len(scores) >= 2 else scores[-1] if scores else None
+            try:
+                move, score = self.aspiration_search(search_pos, player, depth, best_move, center)
+            except SearchTimeout:
+                # 途中で打ち切った深さの結果は使わない
+                self.stats.iterations.append(
+                    (depth, self._nodes - iteration_nodes, time.process_time() - iteration_start, False))
+                break
+            self.stats.iterations.append(
+                (depth, self._nodes - iteration_nodes, time.process_time() - iteration_start, True))
+            # 最善手が変わった・評価値が大きく下がった（同じ偶奇の深さと比べる）なら局面が不安定
+            unstable = completed_depth > 0 and (
+                move != best_move or (len(scores) >= 2 and score < scores[-2] - SCORE_DROP_MARGIN))
+            best_move, best_score = move, score
+            completed_depth = depth
+            scores.append(score)
+            self._root_scores = self._iteration_scores
+            # 次の深さの探索（打ち切られたアスピレーションの読み直しを含む）がルートの置換表の
+            # エントリを上書きする前に、この深さの読み筋を次の手番での再利用のために記録する
+            self.record_pv(pos, player, depth, best_move)
             
-            # 負方向の最大距離と障害物チェック
-            max_neg = 0
-            for i in range(1, 4):
-                nx, ny, nz = x - i*dx, y - i*dy, z - i*dz
-                if 0 <= nx < 4 and 0 <= ny < 4 and 0 <= nz < 4:
-                    # 自分の石がある場合はラインを断ち切る
-                    if board[nz][ny][nx] != 0 and board[nz][ny][nx] != opponent:
-                        break
-                    max_neg = i
-                else:
-                    break
+            # 勝敗が確定したらそれ以上深く読む必要はない
+            if abs(best_score) >= WIN_THRESHOLD:
+                break
             
-            # 合計で4つ以上並べるかチェック
-            if max_pos + max_neg + 1 >= 4:
-                # このライン上で相手の石をカウント
-                opponent_count = 0
-                for i in range(-max_neg, max_pos + 1):
-                    nx, ny, nz = x + i*dx, y + i*dy, z + i*dz
-                    if 0 <= nx < 4 and 0 <= ny < 4 and 0 <= nz < 4:
-                        if board[nz][ny][nx] == opponent:
-                            opponent_count += 1
-                
-                # 相手の石が2個以上あるラインをカウント
-                if opponent_count >= 2:
-                    opponent_double_reach_lines += 1
-        
-        return opponent_double_reach_lines
-    
-    def check_opponent_winning_moves_after_my_move(self, board: Board, x: int, y: int, z: int, player: int) -> int:
-        """指定位置に自分の石を置いた後、相手が勝利できる手の数をカウント（メモリ効率版）"""
-        opponent = 3 - player
-        winning_moves_count = 0
-        
-        # 仮想的に自分の石を置く（1箇所だけ変更）
-        original_value = board[z][y][x]
-        board[z][y][x] = player
-        
-        for opp_x in range(4):
-            for opp_y in range(4):
-                if self.can_place_stone(board, opp_x, opp_y):
-                    opp_z = self.get_height(board, opp_x, opp_y)
-                    
-                    # 仮想的に相手の石を置いてみる（1箇所だけ変更）
-                    original_opp_value = board[opp_z][opp_y][opp_x]
-                    board[opp_z][opp_y][opp_x] = opponent
-                    
-                    if self.check_win(board, opp_x, opp_y, opp_z, opponent):
-                        winning_moves_count += 1
-                    
-                    # 元に戻す
-                    board[opp_z][opp_y][opp_x] = original_opp_value
-        
-        # 元に戻す
-        board[z][y][x] = original_value
-        
-        return winning_moves_count
-    
-    def get_opponent_max_score_after_my_move(self, board: Board, x: int, y: int, z: int, player: int, depth: int = 0) -> int:
-        """指定位置に自分の石を置いた後、相手が得られる最大点数を取得（メモリ効率版）"""
-        opponent = 3 - player
-        max_score = -1
+            # 次の深さが目安の時間（不安定なら上限）に間に合わない見込みなら終了
+            if self._clock.should_stop(time.process_time() - iteration_start, unstable):
+                break
         
-        # 仮想的に自分の石を置く（1箇所だけ変更）
-        original_value = board[z][y][x]
-        board[z][y][x] = player
+        return best_move, best_score
+    
+    def record_pv(self, pos: BitBoard, player: int, depth: int, best_move: Tuple[int, int]) -> None:
+        """読み筋と、それどおりに進んだ場合の次の手番での盤面ハッシュを記録する
+        
+        置換表からたどった読み筋の初手が best_move と違えば、読み筋は best_move だけにする。
+        """
+        self._pv = self.extract_pv(pos, player, depth)
+        if not self._pv or self._pv[0] != best_move:
+            self._pv = [best_move]
+        self._pv_depth = depth
+        self._expected_hash = None
+        self.stats.pv = list(self._pv)
+        if len(self._pv) >= 2:
+            (x1, y1), (x2, y2) = self._pv[0], self._pv[1]
+            pos.place(x1, y1, player)
+            pos.place(x2, y2, 3 - player)
+            self._expected_hash = pos.hashes[0]
+            pos.remove(x2, y2)
+            pos.remove(x1, y1)
+    
+    def search_best_move(self, pos: BitBoard, player: int, depth: int, first_move: Tuple[int, int] = None,
+                         alpha: float = float("-inf"), beta: float = float("inf")) -> Tuple[Tuple[int, int], float]:
+        """αβ枝刈り付きネガマックス探索でルートの最善手と評価値を返す
+        
+        first_move を指定すると、その手を最初に調べる（反復深化で前回の最善手を優先）。
+        (alpha, beta) はアスピレーションウィンドウ。評価値が alpha 以下なら上限値、
+        beta 以上なら下限値が返る（呼び出し側で窓を広げて探索し直す）。
+        2手目以降は principal variation search で、alpha を超えるかだけをヌルウィンドウで調べる。
+        """
+        opponent = 3 - player
+        original_alpha = alpha
+        best_move = None
+        best_score = float("-inf")
+        self._iteration_scores = {}  # この深さでのルートの各手の評価値
         
-        for opp_x in range(4):
-            for opp_y in range(4):
-                if self.can_place_stone(board, opp_x, opp_y):
-                    opp_z = self.get_height(board, opp_x, opp_y)
-                    score = self.evaluate_position(board, opp_x, opp_y, opp_z, opponent, depth)
-                    max_score = max(max_score, score)
+        scored_moves = self.order_moves(pos, player, self.score_moves(pos, player), first_move, 0)
         
-        # 元に戻す
-        board[z][y][x] = original_value
+        for s, x, y, z in scored_moves:
+            pos.place(x, y, player)
+            value = self.search_child(pos, opponent, depth - 1, s, alpha, beta, 1, best_move is not None)
+            pos.remove(x, y)
+            self._iteration_scores[(x, y)] = value
+            
+            if value > best_score:
+                best_score = value
+                best_move = (x, y)
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        break  # 窓の上限を超えた（アスピレーションの失敗）
         
-        return max_score if max_score > -1 else 0
+        if best_move:
+            if best_score <= original_alpha:
+                flag = TT_UPPER
+            elif best_score >= beta:
+                flag = TT_LOWER
+            else:
+                flag = TT_EXACT
+            key, symmetry = pos.canonical_key(player)
+            self._tt.store(key, depth, flag, best_score, transform_move(best_move, symmetry))
+        return best_move, best_score
     
-    def evaluate_position(self, board: Board, x: int, y: int, z: int, player: int, depth: int = 0) -> int:
-        """指定位置の重み（点数）を計算（メモリ効率版）"""
-        # キャッシュキーを生成（盤面の簡易ハッシュ）
-        cache_key = self._get_board_hash(board, x, y, z, player, depth)
+    def aspiration_search(self, pos: BitBoard, player: int, depth: int, first_move: Tuple[int, int],
+                          center: float) -> Tuple[Tuple[int, int], float]:
+        """center を中心とする狭い窓でルートを探索し、外れたら外れた側の窓を広げて探索し直す
+        
+        center が None なら窓を設けずに探索する。
+        """
+        if center is None:
+            return self.search_best_move(pos, player, depth, first_move)
+        delta = ASPIRATION_WINDOW
+        alpha, beta = center - delta, center + delta
+        while True:
+            move, score = self.search_best_move(pos, player, depth, first_move, alpha, beta)
+            if score <= alpha:
+                alpha = score - delta * 2 if delta * 2 <= ASPIRATION_MAX_WINDOW else float("-inf")
+            elif score >= beta:
+                beta = score + delta * 2 if delta * 2 <= ASPIRATION_MAX_WINDOW else float("inf")
+                first_move = move  # 上限を超えた手が最善手の候補
+            else:
+                return move, score
+            self.stats.aspiration_researches += 1
+            delta *= 2
+    
+    def search_child(self, pos: BitBoard, opponent: int, depth: int, s: float, alpha: float, beta: float,
+                     ply: int, null_window: bool) -> float:
+        """石を置いた後の子局面を探索し、親から見たその手の価値（s - 割引率 * 子の評価値）を返す
+        
+        null_window=True なら principal variation search として、まずその手が alpha を
+        超えるかだけをヌルウィンドウで調べ、超えたとき（かつ beta 未満のとき）だけ
+        窓 (alpha, beta) で探索し直す。
+        """
+        # 親の窓 (alpha, beta) を子の評価値の窓に変換
+        child_beta = (s - alpha) / LOOKAHEAD_DISCOUNT
+        if null_window and alpha > float("-inf"):
+            value = s - LOOKAHEAD_DISCOUNT * self.negamax(
+                pos, opponent, depth, child_beta - PVS_EPSILON, child_beta, ply)
+            if value <= alpha or value >= beta:
+                return value
+            self.stats.pvs_researches += 1
+        return s - LOOKAHEAD_DISCOUNT * self.negamax(
+            pos, opponent, depth, (s - beta) / LOOKAHEAD_DISCOUNT, child_beta, ply)
+    
+    def negamax(self, pos: BitBoard, player: int, depth: int, alpha: float, beta: float, ply: int = 1) -> float:
+        """手番側から見た局面の評価値をαβ枝刈り付きネガマックスで求める
+        
+        各手の価値は「その手の静的評価点 - 割引率 * 相手から見た次局面の評価値」。
+        depth=0 の葉では手番側の最大静的評価点を返す（従来の評価関数をそのまま使用）。
+        ply はルートからの手数（キラー手の記録に使う）。
+        締め切りを過ぎると SearchTimeout を送出する。
+        """
+        self._nodes += 1
+        if self._nodes % TIME_CHECK_INTERVAL == 0 and time.process_time() > self._deadline:
+            raise SearchTimeout()
+        
+        # 置換表に十分な深さの結果があれば再利用する（対称な局面は同じエントリを共有）
+        key, symmetry = pos.canonical_key(player)
+        entry = self._tt.probe(key)
+        tt_move = None
+        if entry is not None:
+            _, entry_depth, flag, score, tt_move, _ = entry
+            tt_move = transform_move(tt_move, INVERSE_SYMMETRY[symmetry])
+            if entry_depth >= depth:
+                if flag == TT_EXACT:
+                    return score
+                if flag == TT_LOWER and score > alpha:
+                    alpha = score
+                elif flag == TT_UPPER and score < beta:
+                    beta = score
+                if alpha >= beta:
+                    return score
+        
+        # 即座に勝てる手があれば勝ち
+        if self.threat_cells(pos, player) & self.playable_cells(pos):
+            return WIN_SCORE
+        
+        # 相手の追従策で負けが確定していればこれ以上読まない
+        if self.is_zugzwang_loss(pos, player):
+            return -ZUGZWANG_SCORE
+        
+        moves = self.get_legal_moves(pos)
+        threat_cells = self.find_opponent_threat_cells(pos, player)
+        scored_moves = self.score_moves(pos, player, moves, threat_cells)
+        if not scored_moves:
+            return 0.0  # 満杯: 引き分け
+        
+        if depth <= 0:
+            self.stats.leaf_evaluations += 1
+            self._tt.store(key, 0, TT_EXACT, scored_moves[0][0], None)
+            return scored_moves[0][0]
+        
+        # βカットを起こしやすい手から調べる
+        scored_moves = self.order_moves(pos, player, scored_moves, tt_move, ply)
         
-        if cache_key in self._evaluation_cache:
-            self._cache_hits += 1
-            return self._evaluation_cache[cache_key]
+        opponent = 3 - player
+        losing_moves = self.find_losing_moves(moves, threat_cells)
+        original_alpha = alpha
+        best = float("-inf")
+        best_move = None
+        searched = False  # 窓 (alpha, beta) で読んだ手があるか
+        for s, x, y, z in scored_moves:
+            if (x, y) in losing_moves:
+                # 次に相手が勝つので読むまでもない（子局面の評価値は WIN_SCORE）
+                value = s - LOOKAHEAD_DISCOUNT * WIN_SCORE
+            else:
+                # 最初に読む手以外はヌルウィンドウで alpha を超えるかだけを調べる（PVS）
+                pos.place(x, y, player)
+                value = self.search_child(pos, opponent, depth - 1, s, alpha, beta, ply + 1, searched)
+                pos.remove(x, y)
+                searched = True
+            
+            if value > best:
+                best = value
+                best_move = (x, y)
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        self.record_cutoff(player, x, y, z, depth, ply)
+                        self.count_cutoff((x, y) == scored_moves[0][1:3])
+                        break  # βカット
+        
+        if best <= original_alpha:
+            flag = TT_UPPER
+        elif best >= beta:
+            flag = TT_LOWER
+        else:
+            flag = TT_EXACT
+        self._tt.store(key, depth, flag, best, transform_move(best_move, symmetry))
+        return best
+    
+    def find_losing_moves(self, moves: List[Tuple[int, int, int]], threat_cells: int) -> set:
+        """打つと次に相手が勝つ手 (x, y) の集合を返す（自分に即勝ちがない局面で使う）
+        
+        threat_cells は find_opponent_threat_cells の結果。相手の勝ちマスが今すぐ置ける
+        位置にあれば、そこを受ける手以外はすべて負け。受ける手も含め、真上に相手の
+        勝ちマスがある列に打つ手も負け。
+        """
+        blocks = set()
+        below_threat = set()
+        for x, y, z in moves:
+            index = x + 4 * y + 16 * z
+            if threat_cells >> index & 1:
+                blocks.add((x, y))
+            if threat_cells >> (index + 16) & 1:
+                below_threat.add((x, y))
+        if len(blocks) >= 2:
+            return {(x, y) for x, y, z in moves}  # 受けきれない
+        if blocks:
+            return {(x, y) for x, y, z in moves if (x, y) not in blocks} | below_threat
+        return below_threat
+    
+    def order_moves(self, pos: BitBoard, player: int, scored_moves: List[Tuple[float, int, int, int]],
+                    tt_move: Tuple[int, int], ply: int) -> List[Tuple[float, int, int, int]]:
+        """score_moves の結果を探索する順に並べ替える
+        
+        置換表の手を最初に、残りは静的評価点の高い順に調べる。静的評価点には
+        相手の勝ちマスを残す手・真上に相手の勝ちマスが現れる手（-100点/個）や
+        ダブルリーチを作る手（+100点）の項が入っているため、おおむね 受け → ダブルリーチ →
+        その他 → 相手に勝ちを渡す手 の順になる（即勝ちは negamax が先に返す）。
+        同点の手はキラー手、ヒストリーの順に優先する。
+        """
+        killers = self._killers[ply] if ply < MAX_PLY else ()
+        history = self._history[player]
+        ordered = []
+        for move in scored_moves:
+            s, x, y, z = move
+            ordered.append(((x, y) == tt_move, s, (x, y) in killers, history[x + 4 * y + 16 * z], move))
+        ordered.sort(key=lambda item: item[:4], reverse=True)
+        return [item[4] for item in ordered]
+    
+    def record_cutoff(self, player: int, x: int, y: int, z: int, depth: int, ply: int) -> None:
+        """βカットを起こした手をキラー手とヒストリーに記録する"""
+        if ply < MAX_PLY:
+            killers = self._killers[ply]
+            if killers[0] != (x, y):
+                killers[1] = killers[0]
+                killers[0] = (x, y)
+        self._history[player][x + 4 * y + 16 * z] += depth * depth
+    
+    def count_cutoff(self, first_move: bool) -> None:
+        """βカットの回数を探索統計に数える（first_move は最初に調べた手でカットしたか）"""
+        self.stats.cutoffs += 1
+        if first_move:
+            self.stats.first_move_cutoffs += 1
+    
+    def find_opponent_threat_cells(self, pos: BitBoard, player: int) -> int:
+        """相手が置けば勝てるマスのうち、置けるマスとその1つ上にあるもののビットマスクを返す
         
-        self._cache_misses += 1
+        自分の石を置いても他のマスの相手の勝利条件は変わらないので、局面ごとに一度だけ調べればよい。
+        """
+        playable = self.playable_cells(pos)
+        return self.threat_cells(pos, 3 - player) & (playable | playable << 16)
+    
+    def score_moves(self, pos: BitBoard, player: int, moves: List[Tuple[int, int, int]] = None,
+                    threat_cells: int = None) -> List[Tuple[float, int, int, int]]:
+        """全合法手の静的評価点を (点数, x, y, z) の降順リストで返す
+        
+        呼び出し側で合法手や相手の勝ちマスを調べ済みなら、それを渡すと再計算しない。
+        """
+        if moves is None:
+            moves = self.get_legal_moves(pos)
+        if threat_cells is None:
+            threat_cells = self.find_opponent_threat_cells(pos, player)
+        playable_threats = popcount(threat_cells & self.playable_cells(pos))
+        
+        scored_moves = []
+        for x, y, z in moves:
+            index = x + 4 * y + 16 * z
+            # この手の後に相手が勝てる手の数
+            opponent_winning_moves = playable_threats
+            if threat_cells >> index & 1:
+                opponent_winning_moves -= 1
+            if threat_cells >> (index + 16) & 1:
+                opponent_winning_moves += 1
+            score = self.evaluate_static(pos, x, y, z, player, opponent_winning_moves)
+            scored_moves.append((score, x, y, z))
+        
+        scored_moves.sort(reverse=True)
+        return scored_moves
+    
+    def count_opponent_stones_in_lines(self, pos: BitBoard, x: int, y: int, z: int, player: int) -> int:
+        """指定位置に石を置いた時に、アクセスできるライン上の相手の石の数をカウント"""
+        features = self.extract_features(pos, x, y, z, player)
+        return features[2] + features[4]
+    
+    def count_own_stones_in_lines(self, pos: BitBoard, x: int, y: int, z: int, player: int) -> int:
+        """指定位置に石を置いた時に、アクセスできるライン上の自分の石の数をカウント"""
+        return self.extract_features(pos, x, y, z, player)[1]
+    
+    def count_double_reach_lines(self, pos: BitBoard, x: int, y: int, z: int, player: int) -> int:
+        """指定位置に石を置いた時に、自分の石が2個以上あるアクセスライン数をカウント"""
+        return self.extract_features(pos, x, y, z, player)[5]
+    
+    def count_opponent_double_reach_lines(self, pos: BitBoard, x: int, y: int, z: int, player: int) -> int:
+        """指定位置に石を置いた時に、相手の石が2個以上あるアクセスライン数をカウント"""
+        return self.extract_features(pos, x, y, z, player)[6]
+    
+    def check_opponent_winning_moves_after_my_move(self, pos: BitBoard, x: int, y: int, z: int, player: int) -> int:
+        """指定位置に自分の石を置いた後、相手が勝利できる手の数をカウント"""
+        # 自分の石で相手の勝ちマスが増えることはないので、置いたマスが埋まり、
+        # その真上が置けるようになることだけを反映すればよい（仮想配置は不要）
+        bit = 1 << (x + 4 * y + 16 * z)
+        playable_after = self.playable_cells(pos) & ~bit | bit << 16 & FULL_MASK
+        return popcount(self.threat_cells(pos, 3 - player) & ~bit & playable_after)
+    
+    def evaluate_static(self, pos: BitBoard, x: int, y: int, z: int, player: int, opponent_winning_moves: int, depth: int = 0) -> float:
+        """先読みを除いた指定位置の重み（点数）を計算（探索の葉でも使用）"""
         score = 0
         
-        # 再帰の深さ制限（2手先まで、メモリ効率を保ちつつ探索を維持）
-        if depth >= 2:
-            self._evaluation_cache[cache_key] = score
-            return score
-        
         # depth別の重み設定
         is_my_turn = (depth % 2 == 0)  # 自分の手（depth偶数）か相手の手（depth奇数）か
         
         # 減衰率の計算
         decay_rate = 0.95 ** depth  # depth=0: 1.0, depth=1: 0.8
         
+        # 特徴量はこのセルを通るラインを1回見るだけでまとめて求める
+        (lines, my_stones, opponent_stones, mixed_my_stones, mixed_opponent_stones,
+         double_reach_lines, opponent_double_reach_lines, parity_threats) = self.extract_features(pos, x, y, z, player)
+        
         # 1. アクセス可能なライン数による基本点
-        lines = self.count_potential_lines(board, x, y, z, player)
         score += lines * 2 * decay_rate  # 1ライン = 2点 * 減衰率
         
-        # 2. 方向別の石の数計算と重み付け
-        my_accessible, opponent_accessible, mixed = self.classify_directions(board, x, y, z, player)
-        
+        # 2. 方向別の石の数による重み付け
         # 2-1. 自分のアクセスライン上の自分の石の数加点
-        my_stones = self.count_stones_in_directions(board, x, y, z, my_accessible, player)
         if is_my_turn:
             score += my_stones * 2 * decay_rate  # 自分の手: 自分の石1個 = 2点 * 減衰率
         else:
             score += my_stones * 2 * decay_rate  # 相手の手: 自分の石1個 = 2点 * 減衰率
         
         # 2-2. 相手のアクセスライン上の相手の石の数による段階的加点
-        opponent_stones = self.count_stones_in_directions(board, x, y, z, opponent_accessible, 3 - player)
         if opponent_stones > 0:  # 相手の石のみ
             # 1つ目は2点、2つ目は4点（合計6点）、3つ目は6点（合計12点）
             for i in range(opponent_stones):
@@ -751,9 +2145,6 @@ class MyAI(Alg3D):
                     score += (i + 1) * 2 * decay_rate  # 相手の手: 段階的加点 * 減衰率
         
         # 2-3. 混在ライン上の石による加点・減点
-        mixed_my_stones = self.count_stones_in_directions(board, x, y, z, mixed, player)
-        mixed_opponent_stones = self.count_stones_in_directions(board, x, y, z, mixed, 3 - player)
-        
         # 自分の石による加点
         if mixed_my_stones > 0:
             if is_my_turn:
@@ -781,7 +2172,6 @@ class MyAI(Alg3D):
                 score += 2 * decay_rate  # 相手の手: 中央 = 2点ボーナス * 減衰率
         
         # 4. ダブルリーチ報酬（自分の石が2個以上あるラインが複数ある場合）
-        double_reach_lines = self.count_double_reach_lines(board, x, y, z, player)
         if double_reach_lines >= 2:  # 2個目以降は100点加点
             for i in range(1, double_reach_lines):  # 2個目から計算
                 if is_my_turn:
@@ -790,7 +2180,6 @@ class MyAI(Alg3D):
                     score += 100 * decay_rate   # 相手の手: 2個目以降=100点 * 減衰率
         
         # 5. ダブルリーチ妨害（相手の石が2個以上あるラインが複数ある場合）
-        opponent_double_reach_lines = self.count_opponent_double_reach_lines(board, x, y, z, player)
         if opponent_double_reach_lines >= 2:  # 2個目以降は100点加点
             for i in range(1, opponent_double_reach_lines):  # 2個目から計算
                 if is_my_turn:
@@ -798,63 +2187,16 @@ class MyAI(Alg3D):
                 else:
                     score += 100 * decay_rate   # 相手の手: 2個目以降=100点 * 減衰率
         
-        # 6. 罠回避（統合版：勝利手と最大点数を100点換算で減点）
-        opponent_winning_moves = self.check_opponent_winning_moves_after_my_move(board, x, y, z, player)
-        
-        # 勝利手がある場合は大幅減点
+        # 6. 罠回避: 相手の勝利手がある場合は大幅減点
         if opponent_winning_moves > 0:
-            if is_my_turn:
-                score -= opponent_winning_moves * 100 * decay_rate  # 自分の手: 相手の勝利手1個 = 100点減点 * 減衰率
-            else:
-                score -= opponent_winning_moves * 100 * decay_rate   # 相手の手: 相手の勝利手1個 = 100点減点 * 減衰率
-        else:
-            # 再帰を避けるため、depth制限内でのみ最大点数を計算
-            if depth < 2:
-                opponent_max_score = self.get_opponent_max_score_after_my_move(board, x, y, z, player, depth + 1)
-                if is_my_turn:
-                    score -= opponent_max_score  * 0.9  # 自分の手: 相手の最大点数 * 0.5を減点 * 減衰率
-                else:
-                    score -= opponent_max_score  * 0.9  # 相手の手: 相手の最大点数 * 0.5を減点 * 減衰率
+            score -= opponent_winning_moves * 100 * decay_rate  # 相手の勝利手1個 = 100点減点 * 減衰率
         
-        # キャッシュに保存
-        self._evaluation_cache[cache_key] = score
-        return score
-    
-    def _get_board_hash(self, board: Board, x: int, y: int, z: int, player: int, depth: int) -> str:
-        """盤面の簡易ハッシュを生成（メモリ効率化のため）"""
-        # 重要な部分のみをハッシュ化（全盤面ではなく、周辺のみ）
-        hash_parts = []
-        
-        # 周辺3x3x3の範囲のみをハッシュ化
-        for dz in range(-1, 2):
-            for dy in range(-1, 2):
-                for dx in range(-1, 2):
-                    nx, ny, nz = x + dx, y + dy, z + dz
-                    if 0 <= nx < 4 and 0 <= ny < 4 and 0 <= nz < 4:
-                        hash_parts.append(str(board[nz][ny][nx]))
-                    else:
-                        hash_parts.append('X')  # 範囲外
+        # 7. 偶奇: 自分が最後に取れる段に浮いたリーチを作る手を加点
+        score += parity_threats * PARITY_THREAT_BONUS * decay_rate
         
-        return f"{player}_{depth}_{x}_{y}_{z}_{''.join(hash_parts)}"
-    
-    def find_highest_line_access_move(self, board: Board, player: int):
-        """最も高い重み（点数）の位置を探す"""
-        best_move = None
-        max_score = -1
-        
-        for x in range(4):
-            for y in range(4):
-                if self.can_place_stone(board, x, y):
-                    z = self.get_height(board, x, y)
-                    score = self.evaluate_position(board, x, y, z, player, 0)
-                    
-                    if score > max_score:
-                        max_score = score
-                        best_move = (x, y)
-        
-        return best_move
+        return score
     
-    def print_opponent_interference(self, board: Board, player: int) -> None:
+    def print_opponent_interference(self, pos: BitBoard, player: int) -> None:
         """各マスで妨害できる相手の石数を表示"""
         print(f"\n🚫 プレイヤー{player}の各マスで妨害できる相手の石数:")
         print("  x→   0 1 2 3    （値＝妨害できる相手の石数）")
@@ -862,97 +2204,79 @@ class MyAI(Alg3D):
         for y in range(3, -1, -1):
             print(f"y={y} |", end=" ")
             for x in range(4):
-                if self.can_place_stone(board, x, y):
-                    z = self.get_height(board, x, y)
-                    opponent_stones = self.count_opponent_stones_in_lines(board, x, y, z, player)
+                if self.can_place_stone(pos, x, y):
+                    z = self.get_height(pos, x, y)
+                    features = self.extract_features(pos, x, y, z, player)
+                    opponent_stones = features[2] + features[4]
                     print(f"{opponent_stones:2d}", end=" ")
                 else:
                     print(" .", end=" ")
             print()
     
-    def find_winning_move(self, board: Board, player: int):
-        """勝利できる手を探す（メモリ効率版）"""
-        for x in range(4):
-            for y in range(4):
-                if self.can_place_stone(board, x, y):
-                    z = self.get_height(board, x, y)
-                    
-                    # 仮想的に石を置いてみる（1箇所だけ変更）
-                    original_value = board[z][y][x]
-                    board[z][y][x] = player
-                    
-                    if self.check_win(board, x, y, z, player):
-                        # 元に戻す
-                        board[z][y][x] = original_value
-                        return (x, y)
-                    
-                    # 元に戻す
-                    board[z][y][x] = original_value
-        return None
+    def print_threat_analysis(self, pos: BitBoard, player: int) -> None:
+        """両プレイヤーのリーチを列・高さ・偶奇つきで表示"""
+        labels = {"live": "今すぐ置ける", "good": "偶奇が有利", "bad": "偶奇が不利"}
+        threats = self.analyze_threats(pos)
+        print(f"\n⚡ リーチ分析（手番: プレイヤー{player}）:")
+        for owner in (player, 3 - player):
+            name = "自分" if owner == player else "相手"
+            if not threats[owner]:
+                print(f"  {name}: なし")
+                continue
+            items = [f"({column % 4},{column // 4},{z}) {labels[kind]}" for column, z, kind in threats[owner]]
+            print(f"  {name}: " + ", ".join(items))
+        if self.is_zugzwang_loss(pos, player):
+            print("  ⚠️ 相手の追従策で負けが確定しています")
     
-    def find_center_move(self, board: Board):
+    def find_winning_move(self, pos: BitBoard, player: int):
+        """勝利できる手を探す（置けば4つ揃うマスと置けるマスのビットマスクの共通部分）"""
+        wins = self.threat_cells(pos, player) & self.playable_cells(pos)
+        if not wins:
+            return None
+        index = (wins & -wins).bit_length() - 1
+        return (index % 4, index // 4 % 4)
+    
+    def find_center_move(self, pos: BitBoard):
         """中央付近の空いている位置を探す"""
         center_positions = [(1, 1), (1, 2), (2, 1), (2, 2), (0, 1), (1, 0), (2, 3), (3, 2)]
         
         for x, y in center_positions:
-            if self.can_place_stone(board, x, y):
+            if self.can_place_stone(pos, x, y):
                 return (x, y)
         return None
     
-    def find_first_available_move(self, board: Board):
+    def find_first_available_move(self, pos: BitBoard):
         """最初に見つかった空いている位置に置く"""
         for x in range(4):
             for y in range(4):
-                if self.can_place_stone(board, x, y):
+                if self.can_place_stone(pos, x, y):
                     return (x, y)
         return (0, 0)  # フォールバック
     
-    def can_place_stone(self, board: Board, x: int, y: int):
+    def can_place_stone(self, pos: BitBoard, x: int, y: int):
         """指定位置に石を置けるかチェック"""
-        return board[3][y][x] == 0  # 最上段が空いているか
+        return pos.heights[x + 4 * y] < 4  # 最上段が空いているか
     
-    def get_height(self, board: Board, x: int, y: int):
+    def get_height(self, pos: BitBoard, x: int, y: int):
         """指定位置の現在の高さを取得"""
-        for z in range(4):
-            if board[z][y][x] == 0:
-                return z
-        return 4  # 満杯
+        return pos.heights[x + 4 * y]  # 4 = 満杯
     
-    def check_win(self, board: Board, x: int, y: int, z: int, player: int):
+    def check_win(self, pos: BitBoard, x: int, y: int, z: int, player: int):
         """指定位置で勝利条件を満たしているかチェック"""
-        # 6方向の直線をチェック
-        directions = [
-            (1, 0, 0),   # x軸方向
-            (0, 1, 0),   # y軸方向
-            (0, 0, 1),   # z軸方向
-            (1, 1, 0),   # xy対角線
-            (1, 0, 1),   # xz対角線
-            (0, 1, 1),   # yz対角線
-            (1, 1, 1),   # xyz対角線
-            (1, -1, 0),  # xy逆対角線
-            (1, 0, -1),  # xz逆対角線
-            (0, 1, -1),  # yz逆対角線
-            (1, -1, -1), # xyz逆対角線
-            (1, 1, -1),  # xy正、z負対角線
-            (1, -1, 1),  # xy負、z正対角線
-        ]
+        own = pos.stones[player]
         
-        for dx, dy, dz in directions:
-            count = 1  # 現在の石を含む
-            
-            # 正方向にカウント
-            nx, ny, nz = x + dx, y + dy, z + dz
-            while 0 <= nx < 4 and 0 <= ny < 4 and 0 <= nz < 4 and board[nz][ny][nx] == player:
-                count += 1
-                nx, ny, nz = nx + dx, ny + dy, nz + dz
-            
-            # 負方向にカウント
-            nx, ny, nz = x - dx, y - dy, z - dz
-            while 0 <= nx < 4 and 0 <= ny < 4 and 0 <= nz < 4 and board[nz][ny][nx] == player:
-                count += 1
-                nx, ny, nz = nx - dx, ny - dy, nz - dz
-            
-            if count >= 4:
+        # このセルを通る勝利ラインがすべて自分の石で埋まっているか
+        for line in CELL_LINES[x + 4 * y + 16 * z]:
+            mask = LINE_MASKS[line]
+            if own & mask == mask:
                 return True
         
-        return False
\ No newline at end of file
+        return False
+    
+    def completes_line(self, pos: BitBoard, x: int, y: int, z: int, player: int) -> bool:
+        """空きセルに石を置くと4つ揃うか（通るラインに自分の石が3個あるか）をチェック"""
+        counts = pos.line_counts[player]
+        for line in CELL_LINES[x + 4 * y + 16 * z]:
+            if counts[line] == 3:
+                return True
+        return False
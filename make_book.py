@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+定跡生成スクリプト
+序盤の局面を1局面ずつ時間をかけて探索し、main.py の OPENING_BOOK に書き込む
+
+使い方: python make_book.py --plies 4 --time 10
+先手・後手それぞれについて、自分の手番では探索した最善手だけを、
+相手の手番ではすべての応手をたどる。対称な局面は正規化キーで1つにまとめる。
+"""
+
+import argparse
+import time
+from typing import Dict
+
+import local_framework  # noqa: F401  main より先に読み込む
+
+import main
+from main import BitBoard, MyAI
+
+BOOK_BEGIN = "# === OPENING BOOK BEGIN ==="
+BOOK_END = "# === OPENING BOOK END ==="
+
+
+def search_position(ai: MyAI, pos: BitBoard, player: int, time_limit: float):
+    """制限時間を延ばした MyAI で局面を探索し、最善手 (x, y) を返す"""
+    ai._deadline = time.process_time() + time_limit
+    ai._clock.soft_deadline = ai._clock.hard_deadline = ai._deadline  # 定跡は目安を設けず上限まで読む
+    ai._tt.new_generation()
+    ai.reuse_previous_search(pos, player, None)  # 前の局面の読み筋を持ち越さない
+    return ai.find_best_move(pos, player)
+
+
+def expand(ai: MyAI, pos: BitBoard, player: int, book_side: int, ply: int, max_plies: int,
+           time_limit: float, book: Dict[int, int], visited: set) -> None:
+    """book_side の手番の局面を定跡に登録しながら max_plies 手目まで展開する"""
+    if ply >= max_plies or not any(height < 4 for height in pos.heights):
+        return
+    key, symmetry = pos.canonical_key(player)
+    if key in visited:
+        return
+    visited.add(key)
+
+    if player == book_side:
+        if key not in book:
+            started = time.process_time()
+            x, y = search_position(ai, pos, player, time_limit)
+            book[key] = main.SYMMETRY_COLUMNS[symmetry][x + 4 * y]
+            print(f"  {ply}手目 {player}番: {(x, y)} ({ai._move_reason}, 深さ{ai._pv_depth}, "
+                  f"{time.process_time() - started:.1f}秒) 登録数 {len(book)}", flush=True)
+        x, y = main.SYMMETRY_MOVES[main.INVERSE_SYMMETRY[symmetry]][book[key]]
+        moves = [(x, y)]
+    else:
+        moves = [(column % 4, column // 4) for column in range(16) if pos.heights[column] < 4]
+
+    for x, y in moves:
+        pos.place(x, y, player)
+        if not ai.check_win(pos, x, y, pos.heights[x + 4 * y] - 1, player):
+            expand(ai, pos, 3 - player, book_side, ply + 1, max_plies, time_limit, book, visited)
+        pos.remove(x, y)
+
+
+def format_book(book: Dict[int, int]) -> str:
+    """定跡を main.py に埋め込むリテラルに整形する"""
+    lines = [BOOK_BEGIN, "OPENING_BOOK = {"]
+    for key in sorted(book):
+        lines.append(f"    0x{key:016x}: {book[key]},")
+    lines.append("}")
+    lines.append(BOOK_END)
+    return "\n".join(lines)
+
+
+def write_book(path: str, book: Dict[int, int]) -> None:
+    """path のマーカーの間を生成した定跡で置き換える"""
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+    begin = source.index(BOOK_BEGIN)
+    end = source.index(BOOK_END) + len(BOOK_END)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(source[:begin] + format_book(book) + source[end:])
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description="序盤定跡を生成して main.py に埋め込む")
+    parser.add_argument("--plies", type=int, default=4, help="定跡に含める手数（この手数未満の局面を登録）")
+    parser.add_argument("--time", type=float, default=10.0, help="1局面あたりの探索CPU時間（秒）")
+    parser.add_argument("--output", default="main.py", help="定跡を書き込むファイル")
+    parser.add_argument("--keep", action="store_true", help="既存の定跡を残して足りない局面だけ探索する")
+    args = parser.parse_args()
+
+    book = dict(main.OPENING_BOOK) if args.keep else {}
+    ai = MyAI(time_limit=args.time)
+    for book_side in (1, 2):
+        print(f"{'先手' if book_side == 1 else '後手'}の定跡を生成中...")
+        expand(ai, BitBoard(), 1, book_side, 0, args.plies, args.time, book, set())
+        write_book(args.output, book)  # 途中で止めても先手分は残るように毎回書き込む
+    print(f"✅ {len(book)} 局面を {args.output} に書き込みました")
+
+
+if __name__ == "__main__":
+    main_cli()
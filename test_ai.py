@@ -7,8 +7,10 @@ AIのテストスクリプト
 import random
 import time
 from typing import List, Tuple
-from main import MyAI
+import local_framework  # noqa: F401  main より先に読み込む
+from main import MyAI, THREAT_MAX_DEPTH, threat_mask
 from local_driver import Board
+from corpus import load_corpus, play_random_position
 
 def create_random_board(seed: int = None) -> Board:
     """ランダムな盤面を作成"""
@@ -97,7 +99,7 @@ def test_ai_on_board(board: Board, player: int, test_name: str) -> bool:
     count1, count2 = count_stones(board)
     print(f"盤面の石数: プレイヤー1={count1}個, プレイヤー2={count2}個")
     
-    ai = MyAI()
+    ai = MyAI(verbose=True)  # 盤面と各マスの点数も表示する
     
     try:
         start_time = time.time()
@@ -116,6 +118,224 @@ def test_ai_on_board(board: Board, player: int, test_name: str) -> bool:
         print(f"実行時間: {end_time - start_time:.3f}秒")
         return False
 
+def naive_lines() -> List[List[Tuple[int, int, int]]]:
+    """勝ちラインを main.py の表を使わずに数え上げる（始点と13方向から4マス並びを作る）"""
+    directions = [(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)
+                  if (dx, dy, dz) > (0, 0, 0)]
+    lines = []
+    for x in range(4):
+        for y in range(4):
+            for z in range(4):
+                for dx, dy, dz in directions:
+                    cells = [(x + dx * i, y + dy * i, z + dz * i) for i in range(4)]
+                    if all(0 <= cx < 4 and 0 <= cy < 4 and 0 <= cz < 4 for cx, cy, cz in cells):
+                        lines.append(cells)
+    return lines
+
+NAIVE_LINES = naive_lines()
+
+def naive_height(board: Board, x: int, y: int) -> int:
+    """列 (x, y) に積まれた石の数"""
+    return sum(1 for z in range(4) if board[z][y][x] != 0)
+
+def naive_winning_squares(board: Board, player: int) -> set:
+    """player が次の一手で4つ並べられる列 (x, y) の集合（ラインを1本ずつ調べる素朴な実装）"""
+    squares = set()
+    for cells in NAIVE_LINES:
+        values = [board[z][y][x] for x, y, z in cells]
+        if values.count(player) == 3 and values.count(0) == 1:
+            x, y, z = cells[values.index(0)]
+            if naive_height(board, x, y) == z:
+                squares.add((x, y))
+    return squares
+
+def naive_place(board: Board, x: int, y: int, player: int) -> Board:
+    """列 (x, y) に player の石を置いた新しい盤面を返す"""
+    after = [[row[:] for row in layer] for layer in board]
+    after[naive_height(board, x, y)][y][x] = player
+    return after
+
+def test_corpus_tactics(path: str = "corpus.txt") -> None:
+    """局面集の全局面で、相手の勝ちを受け、相手に次の一手で勝たせない手を選ぶかテスト（誤った手は AssertionError）
+
+    期待する手は main.py を使わず、盤面を1ラインずつ調べる素朴な実装で求める。
+    """
+    print(f"\n{'='*60}")
+    print(f"テスト: 局面集の戦術局面 ({path})")
+    
+    ai = MyAI(time_limit=0.2)
+    blocks = 0
+    checked = 0
+    for pos, player, phase, tags in load_corpus(path):
+        board = pos.to_board()
+        opponent = 3 - player
+        actual = ai.get_move(board, player, (None, None, None))
+        label = f"0x{pos.stones[1]:016x} 0x{pos.stones[2]:016x} ({phase} {','.join(tags)})"
+        legal = [(x, y) for x in range(4) for y in range(4) if naive_height(board, x, y) < 4]
+        assert actual in legal, f"{label}: 置けない手 {actual}"
+        
+        wins = naive_winning_squares(board, player)
+        if wins:
+            assert actual in wins, f"{label}: 期待した勝ち手 {sorted(wins)}, 選択された手 {actual}"
+            checked += 1
+            continue
+        
+        threats = naive_winning_squares(board, opponent)
+        if "block" in tags:
+            assert len(threats) == 1, f"{label}: 受けのタグなのに相手の勝ちマスが {sorted(threats)}"
+            blocks += 1
+        # 相手の勝ちを残す手も、真上に相手の勝ちマスを作る手も誤り（安全な手がない局面は除く）
+        safe = [move for move in legal
+                if not naive_winning_squares(naive_place(board, move[0], move[1], player), opponent)]
+        if safe:
+            assert actual in safe, f"{label}: 安全な手 {safe}, 選択された手 {actual}"
+        checked += 1
+    
+    print(f"{checked}局面すべてで正しい手を選択（うち受け {blocks}局面）")
+
+def naive_threat_mask(stones: int, empty: int) -> int:
+    """threat_mask の素朴な実装: ラインを1本ずつ見て、3マスが石で残り1マスが empty ならその1マスを立てる"""
+    threats = 0
+    for cells in NAIVE_LINES:
+        bits = [1 << (x + 4 * y + 16 * z) for x, y, z in cells]
+        own = [bit for bit in bits if stones & bit]
+        rest = [bit for bit in bits if not stones & bit]
+        if len(own) == 3 and rest[0] & empty:
+            threats |= rest[0]
+    return threats
+
+def test_threat_mask(samples: int = 500, seed: int = 0) -> None:
+    """ビット並列の threat_mask が、ラインを1本ずつ見る素朴な実装と一致するかテスト"""
+    print(f"\n{'='*60}")
+    print("テスト: threat_mask と素朴なライン走査の一致")
+    
+    rng = random.Random(seed)
+    for _ in range(samples):
+        # 重力を無視した任意の石と空きマスでも一致するはず（密度も局面ごとに変える）
+        density = rng.random()
+        stones = sum(1 << i for i in range(64) if rng.random() < density)
+        empty = sum(1 << i for i in range(64) if not stones >> i & 1 and rng.random() < 0.7)
+        expected = naive_threat_mask(stones, empty)
+        actual = threat_mask(stones, empty)
+        assert actual == expected, f"stones=0x{stones:016x} empty=0x{empty:016x}: 期待 0x{expected:016x}, 実際 0x{actual:016x}"
+    print(f"{samples}通りすべてで一致")
+
+def naive_wins_at(board: Board, x: int, y: int, z: int, player: int) -> bool:
+    """(x, y, z) を通るラインのどれかが player の石で埋まっているか"""
+    return any((x, y, z) in cells and all(board[cz][cy][cx] == player for cx, cy, cz in cells)
+               for cells in NAIVE_LINES)
+
+def brute_force_score(board: Board, player: int, memo: dict) -> int:
+    """手番側から見た完全読みの評価値（n 手後の勝ちは 1000 - n、負けは -(1000 - n)、引き分けは 0）"""
+    key = (str(board), player)
+    if key in memo:
+        return memo[key]
+    best = None
+    for x in range(4):
+        for y in range(4):
+            z = naive_height(board, x, y)
+            if z >= 4:
+                continue
+            board[z][y][x] = player
+            if naive_wins_at(board, x, y, z, player):
+                score = 999
+            else:
+                child = brute_force_score(board, 3 - player, memo)
+                score = -child + 1 if child > 0 else -child - 1 if child < 0 else 0
+            board[z][y][x] = 0
+            if best is None or score > best:
+                best = score
+    memo[key] = 0 if best is None else best
+    return memo[key]
+
+def test_endgame_solver(samples: int = 200, seed: int = 0) -> None:
+    """終盤ソルバーの結果と手数が、盤面を総当たりする素朴な完全読みと一致するかテスト"""
+    print(f"\n{'='*60}")
+    print("テスト: 終盤ソルバーと総当たりの一致")
+    
+    rng = random.Random(seed)
+    ai = MyAI()
+    checked = 0
+    while checked < samples:
+        pos, player = play_random_position(rng, ai, 64 - rng.randint(4, 9))
+        board = pos.to_board()
+        if naive_winning_squares(board, player):
+            continue  # 即勝ちは find_best_move がソルバーより前に打つ
+        ai._deadline = time.process_time() + 60
+        move, result, plies = ai.solve_endgame(pos, player)
+        
+        memo = {}
+        expected = brute_force_score(board, player, memo)
+        expected_result = (expected > 0) - (expected < 0)
+        label = f"0x{pos.stones[1]:016x} 0x{pos.stones[2]:016x}"
+        assert result == expected_result, f"{label}: 期待した結果 {expected_result}, ソルバー {result}"
+        if result != 0:
+            assert plies == 1000 - abs(expected), f"{label}: 期待した手数 {1000 - abs(expected)}, ソルバー {plies}"
+        
+        # 選んだ手そのものも最善であること
+        x, y = move
+        z = naive_height(board, x, y)
+        board[z][y][x] = player
+        child = brute_force_score(board, 3 - player, memo)
+        score = -child + 1 if child > 0 else -child - 1 if child < 0 else 0
+        assert score == expected, f"{label}: 手 {move} の評価値 {score}, 最善 {expected}"
+        checked += 1
+    print(f"{checked}局面すべてで一致")
+
+def proves_win(board: Board, attacker: int, depth: int, memo: dict) -> bool:
+    """攻め側の手番から depth 手以内に勝ちを強制できるか（攻め側はリーチを作る手だけ、守り側は全ての手を読む）"""
+    if naive_winning_squares(board, attacker):
+        return True
+    if depth <= 0:
+        return False
+    key = (str(board), depth)
+    if key in memo:
+        return memo[key]
+    proven = False
+    for x in range(4):
+        for y in range(4):
+            if proven or naive_height(board, x, y) >= 4:
+                continue
+            after = naive_place(board, x, y, attacker)
+            if naive_winning_squares(after, attacker):
+                proven = all_replies_lose(after, attacker, depth, memo)
+    memo[key] = proven
+    return proven
+
+def all_replies_lose(board: Board, attacker: int, depth: int, memo: dict) -> bool:
+    """守り側のどの応手の後でも攻め側が勝ちを強制できるか（守り側に即勝ちがあれば False）"""
+    defender = 3 - attacker
+    if naive_winning_squares(board, defender):
+        return False
+    replies = [(x, y) for x in range(4) for y in range(4) if naive_height(board, x, y) < 4]
+    if not replies:
+        return False  # 満杯: 引き分け
+    return all(proves_win(naive_place(board, x, y, defender), attacker, depth - 1, memo) for x, y in replies)
+
+def test_threat_search(samples: int = 300, seed: int = 0) -> None:
+    """連続リーチ探索が見つけた勝ちを、守り側の全ての応手を読む探索で確かめるテスト"""
+    print(f"\n{'='*60}")
+    print("テスト: 連続リーチ探索の勝ちの検証")
+    
+    rng = random.Random(seed)
+    ai = MyAI()
+    found = 0
+    for _ in range(samples):
+        pos, player = play_random_position(rng, ai, rng.randint(10, 40), weighted=True)
+        board = pos.to_board()
+        if naive_winning_squares(board, player) or naive_winning_squares(board, 3 - player):
+            continue  # 勝ちと受けは find_best_move が連続リーチより前に扱う
+        move = ai.find_threat_win(pos, player)
+        if move is None:
+            continue
+        x, y = move
+        label = f"0x{pos.stones[1]:016x} 0x{pos.stones[2]:016x}"
+        after = naive_place(board, x, y, player)
+        assert all_replies_lose(after, player, THREAT_MAX_DEPTH, {}), f"{label}: 手 {move} で勝ちを強制できない"
+        found += 1
+    assert found, "連続リーチの勝ちが1局面も見つからない"
+    print(f"{samples}局面中 {found}局面の勝ちをすべて確認")
+
 def main():
     """メイン関数"""
     print("AIテストスクリプト開始")
@@ -155,6 +375,27 @@ def main():
     result6 = test_ai_on_board(random_board2, 2, "プレイヤー2テスト")
     test_results.append(("プレイヤー2テスト", result6))
     
+    # テスト7: 局面集（corpus.py で生成した実戦に現れうる局面）の戦術局面
+    try:
+        test_corpus_tactics()
+        result7 = True
+    except AssertionError as e:
+        print(f"❌ {e}")
+        result7 = False
+    test_results.append(("局面集の戦術局面", result7))
+    
+    # テスト8-10: 高速化した処理と素朴な実装・総当たりとの突き合わせ（乱数の種は固定）
+    for name, test in [("threat_mask の一致", test_threat_mask),
+                       ("終盤ソルバーの一致", test_endgame_solver),
+                       ("連続リーチ探索の検証", test_threat_search)]:
+        try:
+            test()
+            result = True
+        except AssertionError as e:
+            print(f"❌ {e}")
+            result = False
+        test_results.append((name, result))
+    
     # 結果サマリー
     print(f"\n{'='*60}")
     print("テスト結果サマリー")